@@ -0,0 +1,399 @@
+"""Expectimax player for the adventurer side of One Card Dungeon.
+
+The search alternates two kinds of nodes:
+
+- decision nodes, where the dice are known and the adventurer picks which
+  die goes to speed, attack and defense, where to walk and which monsters
+  to hit;
+- chance nodes, before a roll, worth the average over the 56 distinct
+  results of three dice (weighted by how many orderings give each).
+
+The monster turn in between is deterministic, so it's simulated with the
+real Monster.move from dungeon_core. Search stops at the end of the level:
+reaching the stairs or killing the last monster is scored as a terminal
+state, like dying.
+
+States are encoded as small tuples (see encode_state) and every value,
+monster response and move list is kept in a TranspositionTable, an LRU
+dict with a maximum number of entries. Asking for the same hint twice, or
+on the next frame, costs a dictionary lookup.
+
+With a time_budget, plan_turn deepens one turn at a time and returns the
+plan of the deepest search that finished in time, so a hint asked for from
+the UI loop never holds it up for more than about a frame. What an
+unfinished search computed stays in the table, so asking again goes deeper.
+"""
+from collections import OrderedDict
+from itertools import permutations, product
+from time import perf_counter
+
+from bitboard import iter_bits
+from dungeon_core import TileType, Adventurer, CandidateCache, Monster, OccupancyGrid
+
+# Score of a dead adventurer and base score for a finished level
+DEATH = -1000
+LEVEL_COMPLETE = 500
+
+def dice_outcomes():
+    # Distinct results of three dice (sorted) with their probability
+    counts = {}
+    for roll in product(range(1, 7), repeat=3):
+        key = tuple(sorted(roll))
+        counts[key] = counts.get(key, 0) + 1
+    return [(roll, count / 216) for roll, count in sorted(counts.items())]
+
+DICE_OUTCOMES = dice_outcomes()
+
+class SearchTimeout(Exception):
+    # Raised inside the search when plan_turn's time budget runs out
+    pass
+
+def encode_state(game):
+    # (level, x, y, health, speed, attack, defense, range, monsters)
+    # monsters is a tuple of (x, y, health) in the game's list order, which
+    # matters for the monster turn
+    adv = game.adventurer
+    monsters = tuple((m.x, m.y, m.health) for m in game.monsters)
+    return (game.level, adv.x, adv.y, adv.health, adv.speed, adv.attack, adv.defense, adv.range, monsters)
+
+class TranspositionTable:
+    """Search results by key, dropping the least recently used past max_entries."""
+    def __init__(self, max_entries=200000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+class Turn:
+    """What to do with one roll: dice assignment and the moves and attacks."""
+    def __init__(self, dice, assignment, start, first_targets, path, targets, value):
+        self.dice = dice
+        self.assignment = assignment  # skill for each die, in game.energy_dice order
+        self.first_targets = first_targets  # (x, y) of monsters to hit before moving
+        self.path = path  # (dx, dy) steps from start
+        self.targets = targets  # (x, y) of monsters to hit after moving
+        self.value = value
+        x, y = start
+        for dx, dy in path:
+            x, y = x + dx, y + dy
+        self.destination = (x, y)
+
+    def describe(self):
+        parts = []
+        if self.assignment:
+            parts.append(", ".join(f"{value} to {skill}" for value, skill in zip(self.dice, self.assignment)))
+        if self.first_targets:
+            parts.append(f"attack {len(self.first_targets)}x")
+        if self.path:
+            parts.append(f"move to {self.destination[0]},{self.destination[1]}")
+        if self.targets:
+            parts.append(f"attack {len(self.targets)}x")
+        if not self.path and not self.targets and not self.first_targets:
+            parts.append("stay put")
+        return ", ".join(parts)
+
+class ExpectimaxAI:
+    """Expectimax search over dice rolls, depth counted in adventurer turns.
+
+    At decision nodes deeper than one turn only the `beam` best actions
+    (scored one turn ahead) are searched further. time_budget (seconds, None
+    for no limit) turns on iterative deepening: depth 1 always finishes,
+    deeper searches only count if they finish within the budget.
+    """
+    # Evaluation weights for a state in the middle of a level
+    health_weight = 20
+    stairs_weight = 3
+    monster_health_weight = 8
+
+    def __init__(self, depth=2, beam=4, table_size=200000, time_budget=None):
+        self.depth = depth
+        self.beam = beam
+        self.time_budget = time_budget
+        self.deadline = None
+        self.searched_depth = 0  # depth of the last plan_turn
+        self.table = TranspositionTable(table_size)
+        self.dungeon = None
+        self.layout = None
+
+    def set_dungeon(self, dungeon):
+        # Everything cached depends on the layout and the monster stats
+        key = (dungeon.layout_key, tuple(dungeon.monster_data))
+        if key == self.layout:
+            self.dungeon = dungeon
+            return
+        self.table.clear()
+        self.dungeon = dungeon
+        self.layout = key
+        self.monster_stats = tuple(dungeon.monster_data[1:7])
+        self.board = dungeon.board
+        self.width = dungeon.width
+        self.stairs = next((x, y) for y in range(dungeon.height) for x in range(dungeon.width)
+                           if dungeon.grid[y][x] == TileType.STAIRS)
+        self.stairs_field = dungeon.distance_field(*self.stairs)
+        # Scratch objects for simulating the monster turn
+        self.scratch_adventurer = Adventurer()
+        self.scratch_occupancy = OccupancyGrid(dungeon.width, dungeon.height)
+        self.candidates = CandidateCache()
+
+    # -- public API --
+
+    def plan_turn(self, game):
+        # Best Turn for the current roll. Before the dice are assigned the
+        # assignment is part of the search, afterwards only the remaining
+        # speed and attack points are used.
+        self.set_dungeon(game.dungeon)
+        state = encode_state(game)
+        if all(game.dice_assigned):
+            budgets = [(None, game.remaining_speed, game.remaining_attack, game.total_defense)]
+        else:
+            adv = game.adventurer
+            budgets = []
+            seen = set()
+            for skills in permutations(("speed", "attack", "defense")):
+                values = dict(zip(skills, game.energy_dice))
+                totals = (adv.speed + values["speed"], adv.attack + values["attack"], adv.defense + values["defense"])
+                if totals not in seen:
+                    seen.add(totals)
+                    budgets.append((skills,) + totals)
+
+        start = perf_counter()
+        if self.time_budget is None:
+            depths = [self.depth]
+        else:
+            depths = range(1, self.depth + 1)
+        for depth in depths:
+            # The first search has no deadline, so there is always a plan
+            if depth > depths[0]:
+                self.deadline = start + self.time_budget
+            try:
+                best = self.decide(state, budgets, depth)
+            except SearchTimeout:
+                break
+            finally:
+                self.deadline = None
+            self.searched_depth = depth
+
+        value, (skills, option) = best
+        first_targets, destination, targets = option[1]
+        layers, stop = self.move_layers(state[1], state[2], state[8], None)
+        path = tuple(self.board.path_to(layers, destination[1] * self.width + destination[0], stop))
+        return Turn(tuple(game.energy_dice), skills, (game.adventurer.x, game.adventurer.y),
+                    first_targets, path, targets, value)
+
+    def hint(self, game):
+        if game.game_state not in ("energy", "adventurer"):
+            return ""
+        if game.game_state == "energy" and not game.dice_rolled:
+            return "Hint: roll the dice."
+        if any(game.dice_assigned) and not all(game.dice_assigned):
+            return "Hint: assign the remaining dice first."
+        return "Hint: " + self.plan_turn(game).describe()
+
+    # -- search --
+
+    def decide(self, state, budgets, depth):
+        # budgets: (label, speed, attack, defense) the adventurer can pick from
+        actions = []
+        for label, speed, attack, defense in budgets:
+            for option in self.options(state, speed, attack):
+                actions.append((self.outcome(state, option[0], defense, 1), label, option, defense))
+
+        if depth > 1:
+            actions.sort(key=lambda a: -a[0])
+            actions = [(self.outcome(state, option[0], defense, depth), label, option, defense)
+                       for _, label, option, defense in actions[:self.beam]]
+
+        best = max(actions, key=lambda a: a[0])
+        return best[0], (best[1], best[2])
+
+    def chance(self, state, depth):
+        key = ("chance", state, depth)
+        value = self.table.get(key)
+        if value is not None:
+            return value
+        adv_speed, adv_attack, adv_defense = state[4], state[5], state[6]
+        value = 0.0
+        if depth == 1:
+            # Last turn searched: many rolls share the same totals, score each one once
+            totals_value = {}
+            for roll, probability in DICE_OUTCOMES:
+                best = None
+                for s, a, d in set(permutations(roll)):
+                    totals = (None, adv_speed + s, adv_attack + a, adv_defense + d)
+                    v = totals_value.get(totals)
+                    if v is None:
+                        v = totals_value[totals] = self.decide(state, [totals], 1)[0]
+                    if best is None or v > best:
+                        best = v
+                value += probability * best
+        else:
+            for roll, probability in DICE_OUTCOMES:
+                budgets = {(None, adv_speed + s, adv_attack + a, adv_defense + d) for s, a, d in permutations(roll)}
+                value += probability * self.decide(state, budgets, depth)[0]
+        self.table.put(key, value)
+        return value
+
+    def outcome(self, state, post, defense, depth):
+        # Value of the adventurer's move ending in post, depth turns searched
+        if self.deadline is not None and perf_counter() > self.deadline:
+            raise SearchTimeout
+        if post[0] == "complete":
+            return LEVEL_COMPLETE + self.health_weight * state[3]
+        ax, ay, monsters = post
+        monsters, attack = self.monster_turn(ax, ay, monsters)
+        health = state[3] - (attack // defense if attack > 0 and defense > 0 else 0)
+        if health <= 0:
+            return DEATH
+        next_state = (state[0], ax, ay, health) + state[4:8] + (monsters,)
+        if depth <= 1:
+            return self.evaluate(next_state)
+        return self.chance(next_state, depth - 1)
+
+    def evaluate(self, state):
+        ax, ay, health, monsters = state[1], state[2], state[3], state[8]
+        return (self.health_weight * health
+                - self.stairs_weight * self.stairs_field[ay * self.width + ax]
+                - self.monster_health_weight * sum(m[2] for m in monsters))
+
+    def monster_turn(self, ax, ay, monsters):
+        # Deterministic monster response: new (x, y, health) and total attack
+        key = ("monsters", ax, ay, monsters)
+        result = self.table.get(key)
+        if result is not None:
+            return result
+
+        dungeon = self.dungeon
+        adv = self.scratch_adventurer
+        adv.x, adv.y = ax, ay
+        occupancy = self.scratch_occupancy
+        occupancy.clear()
+        occupancy.place(adv)
+        moving = []
+        for x, y, health in monsters:
+            monster = Monster(x, y, *self.monster_stats)
+            monster.health = health
+            occupancy.place(monster)
+            moving.append(monster)
+
+        # Same steps as Game.process_monster_move and process_monster_attack
+        width = self.width
+        from_adv = dungeon.ranges_from(ax, ay)
+        moving.sort(key=lambda m: from_adv[m.y * width + m.x])
+        for monster in moving:
+            monster.move(ax, ay, dungeon, adv, moving, occupancy, self.candidates)
+        attack = sum(m.attack for m in moving if m.can_attack(ax, ay, moving, dungeon))
+
+        result = (tuple((m.x, m.y, m.health) for m in moving), attack)
+        self.table.put(key, result)
+        return result
+
+    def options(self, state, speed, attack):
+        # Possible adventurer turns as (post, (first_targets, destination, targets)),
+        # post being ("complete",) or (x, y, monsters) after the attacks
+        ax, ay, adv_range, monsters = state[1], state[2], state[7], state[8]
+        key = ("options", ax, ay, adv_range, monsters, speed, attack)
+        result = self.table.get(key)
+        if result is not None:
+            return result
+
+        hits = attack // self.monster_stats[3] if monsters else 0
+        result = []
+        seen = set()
+        layers, stop = self.move_layers(ax, ay, monsters, speed)
+        reached = 0
+        for layer in layers:
+            reached |= layer
+        for index in iter_bits(reached):
+            x, y = self.board.position(index)
+            if (x, y) == self.stairs:
+                result.append((("complete",), ((), (x, y), ())))
+                continue
+            # Hit from where we end up, or before leaving
+            for attack_first in (False, True):
+                hx, hy = (ax, ay) if attack_first else (x, y)
+                left, hit = self.attack(hx, hy, adv_range, monsters, hits)
+                if attack_first and not hit:
+                    continue
+                post = ("complete",) if not left else (x, y, left)
+                if post in seen:
+                    continue
+                seen.add(post)
+                plan = (hit, (x, y), ()) if attack_first else ((), (x, y), hit)
+                result.append((post, plan))
+        self.table.put(key, result)
+        return result
+
+    def in_sight(self, x, y, adv_range):
+        # Bitmask of the tiles that can be hit from (x, y)
+        index = y * self.width + x
+        return self.dungeon.visibility.visible_within(index, self.board.range_mask(index, adv_range))
+
+    def attack(self, x, y, adv_range, monsters, hits):
+        # Spend the hits on the weakest monster in sight, one at a time
+        left = list(monsters)
+        targets = []
+        sight = self.in_sight(x, y, adv_range) if hits else 0
+        width = self.width
+        for _ in range(hits):
+            in_sight = [m for m in left if sight >> (m[1] * width + m[0]) & 1]
+            if not in_sight:
+                break
+            target = min(in_sight, key=lambda m: m[2])
+            index = left.index(target)
+            targets.append(target[:2])
+            if target[2] > 1:
+                left[index] = (target[0], target[1], target[2] - 1)
+            else:
+                left.pop(index)
+        return tuple(left), tuple(targets)
+
+    def move_layers(self, ax, ay, monsters, speed):
+        # Cost layers of the adventurer's move (see Board.cost_layers).
+        # The stairs end the move, so nothing is reached through them.
+        board = self.board
+        start = board.bit(ax, ay)
+        passable = self.dungeon.walkable_mask & ~board.mask_of((m[0], m[1]) for m in monsters)
+        stop = board.bit(*self.stairs) & ~start
+        return board.cost_layers(start, passable, speed, stop), stop
+
+def play_turn(game, turn):
+    # Carry out a planned Turn on the game (the dice must already be assigned)
+    for target in turn.first_targets:
+        if not attack_at(game, target):
+            break
+    for dx, dy in turn.path:
+        if game.game_state != "adventurer" or not game.move_adventurer(dx, dy):
+            break
+    for target in turn.targets:
+        if not attack_at(game, target):
+            break
+
+def attack_at(game, target):
+    if game.game_state != "adventurer":
+        return False
+    for i, monster in enumerate(game.monsters):
+        if (monster.x, monster.y) == target:
+            return game.attack_monster(i)
+    return False
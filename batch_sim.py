@@ -0,0 +1,463 @@
+"""Batch simulator: N full games advanced in lockstep with NumPy.
+
+Every game is a row in a set of arrays (positions, health, dice, state
+codes) and each turn is a handful of vectorized steps that follow the
+rules of dungeon_core.Game:
+
+    roll_energy_dice -> assign_dice -> adventurer move/attack
+    -> process_monster_move -> process_monster_attack -> advance_level
+
+Tiles are stored as indices (y * GRID_SIZE + x). The adventurer plays a
+fixed "stairs" policy: highest die to speed, middle to defense, lowest to
+attack, walk towards the stairs around the monsters and hit whatever is in
+range at the end of the move.
+
+Run it from the command line to print win rates and deaths per level:
+
+    python batch_sim.py --games 100000 --seed 1
+"""
+import argparse
+import time
+
+import numpy as np
+
+from dungeon_core import GRID_SIZE, MOVES, TileType, DungeonLevel, get_range_matrix
+
+MAX_LEVEL = 12
+MAX_MONSTERS = 3
+TILES = GRID_SIZE * GRID_SIZE
+START_TILE = 1 * GRID_SIZE + 1
+
+# Per-game columns hold small numbers (tiles, stats), 2 bytes are plenty.
+# Turns get 4: --max-turns may go past what 2 bytes hold.
+STATE_DTYPE = np.int16
+TURNS_DTYPE = np.int32
+
+# Game state codes
+RUNNING = 0
+GAME_OVER = 1
+VICTORY = 2
+TIMEOUT = 3
+
+# Same neighbour order as Monster.get_next_step: orthogonal first, then diagonal
+STEPS = [(dx, dy) for dx, dy, cost in MOVES]
+STEP_COSTS = np.array([cost for dx, dy, cost in MOVES])
+
+UNREACHABLE = 10 ** 6
+
+_tables = None
+
+class Tables:
+    """Per-level lookup arrays shared by every batch."""
+    def __init__(self):
+        levels = MAX_LEVEL + 1
+        self.walls = np.zeros((levels, TILES), dtype=bool)
+        self.stairs = np.zeros((levels, TILES), dtype=bool)
+        self.spawnable = np.zeros((levels, TILES), dtype=bool)
+        self.visible = np.zeros((levels, TILES, TILES), dtype=bool)
+        # Distance fields: fields[level, target, tile]
+        self.fields = np.zeros((levels, TILES, TILES), dtype=np.int64)
+        self.stairs_field = np.zeros((levels, TILES), dtype=np.int64)
+        # count, health, speed, attack, defense, range
+        self.monster_stats = np.zeros((levels, 6), dtype=np.int64)
+
+        for level in range(1, levels):
+            dungeon = DungeonLevel(level)
+            self.monster_stats[level] = dungeon.monster_data[:6]
+            for t in range(TILES):
+                x, y = t % GRID_SIZE, t // GRID_SIZE
+                tile = dungeon.grid[y][x]
+                self.walls[level, t] = tile == TileType.WALL
+                self.stairs[level, t] = tile == TileType.STAIRS
+                # Same rule as Game.spawn_monsters
+                self.spawnable[level, t] = tile == TileType.FLOOR and not (abs(x - 1) <= 1 and abs(y - 1) <= 1)
+                visible = dungeon.visibility.visible[t]
+                self.visible[level, t] = [(visible >> b) & 1 == 1 for b in range(TILES)]
+            for target in range(TILES):
+                field = dungeon.distance_field(target % GRID_SIZE, target // GRID_SIZE)
+                self.fields[level, target] = np.minimum(field, UNREACHABLE)
+            self.stairs_field[level] = self.fields[level, np.flatnonzero(self.stairs[level])[0]]
+        self.walls[0] = self.walls[1]
+        self.visible[0] = self.visible[1]
+
+        # Neighbour tile of every tile in STEPS order, -1 outside the grid
+        self.neighbours = np.full((TILES, len(STEPS)), -1, dtype=np.int64)
+        for t in range(TILES):
+            x, y = t % GRID_SIZE, t // GRID_SIZE
+            for i, (dx, dy) in enumerate(STEPS):
+                if 0 <= x + dx < GRID_SIZE and 0 <= y + dy < GRID_SIZE:
+                    self.neighbours[t, i] = (y + dy) * GRID_SIZE + x + dx
+        self.safe_neighbours = np.maximum(self.neighbours, 0)
+        self.neighbour_costs = np.where(self.neighbours >= 0, STEP_COSTS[None, :], UNREACHABLE)
+
+        xs = np.arange(TILES) % GRID_SIZE
+        ys = np.arange(TILES) // GRID_SIZE
+        self.range = np.array(get_range_matrix(GRID_SIZE))
+        # find_best_position scans x first, then y; ties keep that order
+        self.scan_order = xs * GRID_SIZE + ys
+
+def get_tables():
+    global _tables
+    if _tables is None:
+        _tables = Tables()
+    return _tables
+
+class BatchResult:
+    def __init__(self, sim, elapsed):
+        self.games = sim.n
+        self.wins = int((sim.state == VICTORY).sum())
+        self.timeouts = int((sim.state == TIMEOUT).sum())
+        self.deaths_by_level = np.bincount(sim.level[sim.state == GAME_OVER], minlength=MAX_LEVEL + 1)[1:MAX_LEVEL + 1]
+        self.mean_turns = float(sim.turns.mean()) if sim.n else 0.0
+        self.elapsed = elapsed
+
+    @property
+    def win_rate(self):
+        return self.wins / self.games if self.games else 0.0
+
+    def summary(self):
+        lines = [
+            f"Games: {self.games}  wins: {self.wins} ({self.win_rate:.2%})  timeouts: {self.timeouts}",
+            f"Mean turns: {self.mean_turns:.1f}  time: {self.elapsed:.2f}s ({self.games / max(self.elapsed, 1e-9):.0f} games/s)",
+            "Deaths per level:",
+        ]
+        for level, deaths in enumerate(self.deaths_by_level, start=1):
+            lines.append(f"  {level:2d}: {deaths} ({deaths / max(self.games, 1):.2%})")
+        return "\n".join(lines)
+
+class BatchSimulator:
+    def __init__(self, n_games, seed=None, max_turns=1000, monster_stats=None):
+        self.n = n_games
+        self.rng = np.random.default_rng(seed)
+        if not 0 < max_turns <= np.iinfo(TURNS_DTYPE).max:
+            raise ValueError(f"max_turns must be between 1 and {np.iinfo(TURNS_DTYPE).max}, got {max_turns}")
+        self.max_turns = max_turns
+        self.t = get_tables()
+        # Per-level (count, health, speed, attack, defense, range), the
+        # get_monster_data numbers unless a sweep passes its own
+        if monster_stats is None:
+            self.monster_stats = self.t.monster_stats
+        else:
+            self.monster_stats = np.asarray(monster_stats, dtype=np.int64)
+            if self.monster_stats.shape != self.t.monster_stats.shape:
+                raise ValueError(f"monster_stats must have shape {self.t.monster_stats.shape}")
+            if (self.monster_stats[1:, 0] > MAX_MONSTERS).any():
+                raise ValueError(f"at most {MAX_MONSTERS} monsters per level")
+            if (self.monster_stats[1:, 4] < 1).any():
+                raise ValueError("monster defense must be at least 1")
+
+        n = n_games
+        self.state = np.full(n, RUNNING, dtype=STATE_DTYPE)
+        self.level = np.ones(n, dtype=STATE_DTYPE)
+        self.turns = np.zeros(n, dtype=TURNS_DTYPE)
+        self.level_done = np.zeros(n, dtype=bool)
+
+        # Adventurer
+        self.adv = np.full(n, START_TILE, dtype=STATE_DTYPE)
+        self.health = np.full(n, 6, dtype=STATE_DTYPE)
+        self.max_health = np.full(n, 6, dtype=STATE_DTYPE)
+        self.speed = np.ones(n, dtype=STATE_DTYPE)
+        self.attack = np.ones(n, dtype=STATE_DTYPE)
+        self.defense = np.ones(n, dtype=STATE_DTYPE)
+        self.range = np.full(n, 2, dtype=STATE_DTYPE)
+
+        # Energy dice and totals for the current turn
+        self.energy_dice = np.ones((n, 3), dtype=STATE_DTYPE)
+        self.total_speed = np.zeros(n, dtype=STATE_DTYPE)
+        self.total_attack = np.zeros(n, dtype=STATE_DTYPE)
+        self.total_defense = np.zeros(n, dtype=STATE_DTYPE)
+        self.remaining_speed = np.zeros(n, dtype=STATE_DTYPE)
+        self.remaining_attack = np.zeros(n, dtype=STATE_DTYPE)
+
+        # Monsters, one column per slot
+        self.mpos = np.zeros((n, MAX_MONSTERS), dtype=STATE_DTYPE)
+        self.mhealth = np.zeros((n, MAX_MONSTERS), dtype=STATE_DTYPE)
+        self.alive = np.zeros((n, MAX_MONSTERS), dtype=bool)
+
+        self.spawn_monsters(np.ones(n, dtype=bool))
+
+    def monster_stat(self, column, rows=None):
+        level = self.level if rows is None else self.level[rows]
+        return self.monster_stats[np.minimum(level, MAX_LEVEL), column]
+
+    def spawn_monsters(self, mask):
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        level = self.level[rows]
+        # Random keys on the eligible tiles behave like random.shuffle
+        keys = self.rng.random((rows.size, TILES))
+        keys[~self.t.spawnable[level]] = np.inf
+        self.mpos[rows] = np.argsort(keys, axis=1)[:, :MAX_MONSTERS]
+        count = self.monster_stat(0, rows)
+        self.alive[rows] = np.arange(MAX_MONSTERS)[None, :] < count[:, None]
+        self.mhealth[rows] = np.where(self.alive[rows], self.monster_stat(1, rows)[:, None], 0)
+
+    def roll_energy_dice(self, mask):
+        rows = np.flatnonzero(mask)
+        self.energy_dice[rows] = self.rng.integers(1, 7, size=(rows.size, 3))
+
+    def assign_dice(self, mask):
+        # Highest die to speed, middle to defense, lowest to attack
+        rows = np.flatnonzero(mask)
+        dice = np.sort(self.energy_dice[rows], axis=1)
+        self.total_speed[rows] = self.speed[rows] + dice[:, 2]
+        self.total_defense[rows] = self.defense[rows] + dice[:, 1]
+        self.total_attack[rows] = self.attack[rows] + dice[:, 0]
+        self.remaining_speed[rows] = self.total_speed[rows]
+        self.remaining_attack[rows] = self.total_attack[rows]
+
+    def occupancy(self, rows, skip=None):
+        # Tiles taken by living monsters (optionally ignoring one slot)
+        occupied = np.zeros((rows.size, TILES), dtype=bool)
+        for k in range(MAX_MONSTERS):
+            if k == skip:
+                continue
+            alive = self.alive[rows, k]
+            occupied[np.flatnonzero(alive), self.mpos[rows[alive], k]] = True
+        return occupied
+
+    def adventurer_phase(self, mask):
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        level = self.level[rows]
+        blocked = self.t.walls[level] | self.occupancy(rows)
+        picks = np.arange(rows.size)
+
+        # Monsters farther from the stairs than the adventurer can't be in
+        # the way, so those rows keep the wall-only field
+        field = self.t.stairs_field[level]
+        in_the_way = (self.alive[rows] & (field[picks[:, None], self.mpos[rows]] < field[picks, self.adv[rows]][:, None])).any(axis=1)
+        if in_the_way.any():
+            field[in_the_way] = self.route_field(field[in_the_way], blocked[in_the_way])
+
+        # Walk down the cost field towards the stairs
+        cur = self.adv[rows].copy()
+        remaining = self.remaining_speed[rows].copy()
+        moving = np.ones(rows.size, dtype=bool)
+        while moving.any():
+            nb = self.t.neighbours[cur]
+            safe_nb = np.where(nb >= 0, nb, 0)
+            valid = (nb >= 0) & ~blocked[picks[:, None], safe_nb]
+            valid &= STEP_COSTS[None, :] <= remaining[:, None]
+            nb_field = np.where(valid, field[picks[:, None], safe_nb], UNREACHABLE)
+            choice = np.argmin(nb_field, axis=1)
+            better = nb_field[picks, choice] < field[picks, cur]
+            moving &= better
+            cur = np.where(moving, safe_nb[picks, choice], cur)
+            remaining = np.where(moving, remaining - STEP_COSTS[choice], remaining)
+        self.adv[rows] = cur
+        self.remaining_speed[rows] = remaining
+        self.level_done[rows] |= self.t.stairs[level, cur]
+
+        # Attack the first monster in range and sight until out of points
+        attacking = ~self.level_done[rows]
+        while attacking.any():
+            sub = rows[attacking]
+            lvl = self.level[sub]
+            mpos = self.mpos[sub]
+            can_hit = (self.alive[sub]
+                       & (self.t.range[self.adv[sub][:, None], mpos] <= self.range[sub][:, None])
+                       & self.t.visible[lvl[:, None], self.adv[sub][:, None], mpos]
+                       & (self.remaining_attack[sub] >= self.monster_stat(4, sub))[:, None])
+            hits = can_hit.any(axis=1)
+            target = np.argmax(can_hit, axis=1)
+            hit_rows = sub[hits]
+            hit_slots = target[hits]
+            self.mhealth[hit_rows, hit_slots] -= 1
+            self.remaining_attack[hit_rows] -= self.monster_stat(4, hit_rows)
+            self.alive[hit_rows, hit_slots] &= self.mhealth[hit_rows, hit_slots] > 0
+            attacking[attacking] = hits
+        self.level_done[rows] |= ~self.alive[rows].any(axis=1)
+
+    def route_field(self, field, blocked):
+        # Distance field that also avoids the blocked tiles (like
+        # compute_distance_field with occupied tiles), relaxed in place and
+        # only for the rows that still change
+        target = field == 0
+        route = np.where(target, 0, UNREACHABLE)
+        closed = blocked & ~target
+        active = np.arange(route.shape[0])
+        while active.size:
+            current = route[active]
+            through = (current[:, self.t.safe_neighbours] + self.t.neighbour_costs[None, :, :]).min(axis=2)
+            relaxed = np.where(closed[active], UNREACHABLE, np.minimum(current, through))
+            changed = (relaxed != current).any(axis=1)
+            route[active] = relaxed
+            active = active[changed]
+        return route
+
+    def process_monster_move(self, mask):
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        # Sort monsters by distance to the adventurer (stable, dead ones last)
+        ranges = np.where(self.alive[rows], self.t.range[self.mpos[rows], self.adv[rows][:, None]], UNREACHABLE)
+        order = np.argsort(ranges, axis=1, kind="stable")
+        self.mpos[rows] = np.take_along_axis(self.mpos[rows], order, axis=1)
+        self.mhealth[rows] = np.take_along_axis(self.mhealth[rows], order, axis=1)
+        self.alive[rows] = np.take_along_axis(self.alive[rows], order, axis=1)
+
+        for k in range(MAX_MONSTERS):
+            movers = rows[self.alive[rows, k]]
+            if movers.size:
+                self.move_monster(movers, k)
+
+    def find_best_position(self, rows, k, blocked):
+        # Vectorized Monster.find_best_position for slot k
+        picks = np.arange(rows.size)
+        adv = self.adv[rows]
+        me = self.mpos[rows, k]
+        monster_range = self.monster_stat(5, rows)
+
+        # Line of sight is traced from the candidate tile to the adventurer
+        candidates = ~blocked & self.t.visible[self.level[rows], :, adv]
+        candidates[picks, adv] = False
+        range_to_adv = self.t.range[adv]
+        in_range = candidates & (range_to_adv <= monster_range[:, None])
+        use = np.where(in_range.any(axis=1)[:, None], in_range, candidates)
+
+        score = (np.abs(monster_range[:, None] - range_to_adv) * 64 + self.t.range[me]) * 64 + self.t.scan_order[None, :]
+        score = np.where(use, score, UNREACHABLE * 64)
+        best = np.argmin(score, axis=1)
+        return np.where(use.any(axis=1), best, -1)
+
+    def move_monster(self, rows, k):
+        picks = np.arange(rows.size)
+        blocked = self.t.walls[self.level[rows]] | self.occupancy(rows, skip=k)
+        best = self.find_best_position(rows, k, blocked)
+
+        # Monsters can't step on the adventurer either
+        blocked[picks, self.adv[rows]] = True
+
+        # Walk down the distance field of the best position like Monster.move:
+        # where a taken tile was in the way, walk again from the start around
+        # the taken tiles, if there is a way round
+        start = self.mpos[rows, k]
+        speed = self.monster_stat(2, rows)
+        field = self.t.fields[self.level[rows], np.maximum(best, 0)]
+        cur, diverted = self.walk_monster(field, blocked, start, speed, best >= 0)
+        if diverted.any():
+            sub = np.flatnonzero(diverted)
+            route = self.route_field(field[sub], blocked[sub])
+            around = route[np.arange(sub.size), start[sub]] < UNREACHABLE
+            sub = sub[around]
+            cur[sub], _ = self.walk_monster(route[around], blocked[sub], start[sub], speed[sub],
+                                            np.ones(sub.size, dtype=bool))
+        self.mpos[rows, k] = cur
+
+    def walk_monster(self, field, blocked, cur, remaining, moving):
+        # Steps down field while the speed lasts, like Monster.walk: the end
+        # tiles, and the rows where a taken tile is on the way the field alone
+        # would take
+        picks = np.arange(cur.size)
+        ahead = moving.copy()
+        diverted = np.zeros(cur.size, dtype=bool)
+        while moving.any():
+            safe_nb, downhill, cost = self.downhill(field, cur, remaining)
+            wanted = np.argmin(np.where(downhill, cost, UNREACHABLE), axis=1)
+            diverted |= moving & downhill.any(axis=1) & blocked[picks, safe_nb[picks, wanted]]
+            valid = downhill & ~blocked[picks[:, None], safe_nb]
+            choice = np.argmin(np.where(valid, cost, UNREACHABLE), axis=1)
+            moving &= valid.any(axis=1)
+            cur = np.where(moving, safe_nb[picks, choice], cur)
+            remaining = np.where(moving, remaining - STEP_COSTS[choice], remaining)
+            moving &= remaining > 0
+
+        # A taken tile further down the way counts too
+        tile = cur
+        no_limit = np.full(cur.size, UNREACHABLE)
+        ahead &= ~diverted
+        while ahead.any():
+            safe_nb, downhill, cost = self.downhill(field, tile, no_limit)
+            wanted = np.argmin(np.where(downhill, cost, UNREACHABLE), axis=1)
+            ahead &= downhill.any(axis=1)
+            tile = np.where(ahead, safe_nb[picks, wanted], tile)
+            diverted |= ahead & blocked[picks, tile]
+            ahead &= ~diverted
+        return cur, diverted
+
+    def downhill(self, field, cur, remaining):
+        # Neighbours of cur (0 off the board), which of them are affordable
+        # and closer on field, and field + step cost for each
+        picks = np.arange(cur.size)
+        nb = self.t.neighbours[cur]
+        safe_nb = np.where(nb >= 0, nb, 0)
+        nb_field = field[picks[:, None], safe_nb]
+        downhill = ((nb >= 0) & (STEP_COSTS[None, :] <= remaining[:, None])
+                    & (nb_field < field[picks, cur][:, None]))
+        return safe_nb, downhill, nb_field + STEP_COSTS[None, :]
+
+    def process_monster_attack(self, mask):
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        adv = self.adv[rows][:, None]
+        mpos = self.mpos[rows]
+        attackers = (self.alive[rows]
+                     & (self.t.range[mpos, adv] <= self.monster_stat(5, rows)[:, None])
+                     & self.t.visible[self.level[rows][:, None], mpos, adv])
+        total = attackers.sum(axis=1) * self.monster_stat(3, rows)
+        defense = self.total_defense[rows]
+        damage = np.where((total > 0) & (defense > 0), total // np.maximum(defense, 1), 0)
+        self.health[rows] -= damage
+
+        dead = rows[self.health[rows] <= 0]
+        self.health[dead] = 0
+        self.state[dead] = GAME_OVER
+
+    def advance_level(self, mask):
+        # Heal when at half health or less, otherwise upgrade speed
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        heal = self.health[rows] <= self.max_health[rows] // 2
+        self.health[rows] = np.where(heal, self.max_health[rows], self.health[rows])
+        self.speed[rows] += ~heal
+
+        self.level[rows] += 1
+        won = rows[self.level[rows] > MAX_LEVEL]
+        self.state[won] = VICTORY
+        self.level[won] = MAX_LEVEL
+
+        next_level = np.zeros(self.n, dtype=bool)
+        next_level[rows[self.level[rows] <= MAX_LEVEL]] = True
+        self.adv[next_level] = START_TILE
+        self.spawn_monsters(next_level)
+        self.level_done[rows] = False
+
+    def step(self):
+        active = self.state == RUNNING
+        self.roll_energy_dice(active)
+        self.assign_dice(active)
+        self.adventurer_phase(active)
+
+        monsters_turn = active & ~self.level_done
+        self.process_monster_move(monsters_turn)
+        self.process_monster_attack(monsters_turn)
+
+        self.advance_level(active & self.level_done & (self.state == RUNNING))
+        self.turns += active
+        self.state[(self.state == RUNNING) & (self.turns >= self.max_turns)] = TIMEOUT
+
+    def run(self):
+        start = time.perf_counter()
+        while (self.state == RUNNING).any():
+            self.step()
+        return BatchResult(self, time.perf_counter() - start)
+
+def run_batch(n_games, seed=None, max_turns=1000, monster_stats=None):
+    return BatchSimulator(n_games, seed, max_turns, monster_stats).run()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run many One Card Dungeon games in lockstep.")
+    parser.add_argument("--games", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    args = parser.parse_args()
+
+    print(run_batch(args.games, args.seed, args.max_turns).summary())
+
+if __name__ == "__main__":
+    main()
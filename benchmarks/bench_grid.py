@@ -0,0 +1,119 @@
+"""How the rules scale with the size of the board.
+
+For each size, times building a level (DungeonLevel alone, then its
+per-layout tables from cold caches, then a whole Game with its monsters) and
+then plays seeded turns with the stairs policy: roll, assign, adventurer
+turn and monster turn. The tables of every level are built before its turns
+are timed and level changes aren't timed, so "turn ms" is the cost of a
+turn on a layout already seen and "tables ms" the one-off cost of a new one.
+Boards up to dungeon_core.SMALL_BOARD_TILES tiles use the full per-layout
+tables, bigger ones the lazy line of sight and the bounded distance fields,
+so both sides of the switch show up in the report.
+
+    python benchmarks/bench_grid.py
+    python benchmarks/bench_grid.py --sizes 7 64 256 --turns 50 --save grid.json
+"""
+import argparse
+import json
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dungeon_core
+from dungeon_core import SMALL_BOARD_TILES, Game, DungeonLevel, set_error_mode
+from policies import get_policy
+
+SIZES = (7, 16, 32, 64, 128, 256)
+
+def warm_tables(dungeon):
+    # Per-layout tables the first turn on a layout would otherwise build
+    dungeon.visibility
+    dungeon.layout_index
+
+def clear_tables():
+    for cache in (dungeon_core._visibility_tables, dungeon_core._layout_indexes,
+                  dungeon_core._distance_fields):
+        cache.clear()
+
+def time_levels(size, levels):
+    # (seconds per DungeonLevel, seconds per set of tables built from cold
+    # caches), one level for each layout pattern in turn
+    build = 0.0
+    tables = 0.0
+    for level in range(1, levels + 1):
+        start = perf_counter()
+        dungeon = DungeonLevel(level, size, size)
+        build += perf_counter() - start
+        clear_tables()
+        start = perf_counter()
+        warm_tables(dungeon)
+        tables += perf_counter() - start
+    return build / levels, tables / levels
+
+def play_turns(size, games, turns, seed):
+    # (seconds per new game, seconds per turn, turns played)
+    policy = get_policy("stairs")
+    setup = 0.0
+    elapsed = 0.0
+    played = 0
+    for i in range(games):
+        start = perf_counter()
+        game = Game(seed=f"{seed}-{size}-{i}", width=size, height=size)
+        warm_tables(game.dungeon)
+        setup += perf_counter() - start
+
+        for _ in range(turns):
+            if game.game_state in ("game_over", "victory"):
+                break
+            start = perf_counter()
+            if game.game_state == "energy":
+                game.roll_energy_dice()
+                policy.assign_dice(game)
+            if game.game_state == "adventurer":
+                policy.play_turn(game)
+                if game.game_state == "adventurer":
+                    game.end_adventurer_turn()
+            elapsed += perf_counter() - start
+            played += 1
+            # A new level is setup, not a turn
+            if game.game_state == "level_complete":
+                game.advance_level(policy.choose_upgrade(game))
+                warm_tables(game.dungeon)
+    return setup / games, elapsed / max(played, 1), played
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark level setup and turns on boards of growing size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--games", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=30, help="turns played per game")
+    parser.add_argument("--levels", type=int, default=4, help="levels built for the setup time")
+    parser.add_argument("--seed", default="grid")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    set_error_mode("strict")
+    results = {}
+    print(f"{'size':>9} {'tables':>7} {'level ms':>9} {'tables ms':>10} {'game ms':>9} {'turn ms':>9} {'turns':>6}")
+    for size in args.sizes:
+        level, build = time_levels(size, args.levels)
+        setup, turn, played = play_turns(size, args.games, args.turns, args.seed)
+        tables = "full" if size * size <= SMALL_BOARD_TILES else "lazy"
+        results[size] = {
+            "tables": tables,
+            "level_ms": level * 1000,
+            "tables_ms": build * 1000,
+            "game_ms": setup * 1000,
+            "turn_ms": turn * 1000,
+            "turns": played,
+        }
+        print(f"{size:>4}x{size:<4} {tables:>7} {level * 1000:9.3f} {build * 1000:10.3f} {setup * 1000:9.3f} "
+              f"{turn * 1000:9.3f} {played:6d}")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
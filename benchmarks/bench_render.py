@@ -0,0 +1,208 @@
+"""Frame times of draw_game, without a window.
+
+Plays a few seeded games with the stairs policy and keeps a snapshot after
+every step (roll, assignment, adventurer turn, monster turn, level choice).
+The benchmark then draws those states one per frame with the real front
+end, on SDL's dummy video driver, and reports p50/p95/p99 frame times and
+how the time splits between the sections of the renderer.
+
+Scenarios:
+
+    game         "One card dungeon.py", dirty-region drawing as in play
+    game-full    same states, the whole window repainted every frame
+    tutorial     the tutorial front end with its panel open, turning one
+                 page every --page-frames frames (Tutorial.draw_page)
+
+    python benchmarks/bench_render.py --frames 2000
+    python benchmarks/bench_render.py --scenario tutorial --save render.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+from time import perf_counter
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from policies import get_policy
+
+SCENARIOS = ("game", "game-full", "tutorial")
+
+# Renderer method -> section name in the report
+SECTIONS = (
+    ("draw_header", "header"),
+    ("draw_stats", "stats"),
+    ("draw_monsters", "monster panel"),
+    ("draw_dice", "dice"),
+    ("draw_buttons", "buttons"),
+    ("draw_message", "message"),
+    ("draw_grid", "grid"),
+    ("draw_entity", "entities"),
+)
+
+def load_script(filename):
+    # The front ends are scripts with spaces in their names
+    spec = importlib.util.spec_from_file_location(filename.replace(" ", "_")[:-3], os.path.join(ROOT, filename))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def script_states(game_class, games, seed):
+    # Snapshots of seeded stairs-policy games after every step
+    policy = get_policy("stairs")
+    states = []
+    for i in range(games):
+        game = game_class(seed=f"{seed}-{i}")
+        states.append(game.snapshot())
+        while game.game_state not in ("game_over", "victory"):
+            if game.game_state == "energy":
+                game.roll_energy_dice()
+                states.append(game.snapshot())
+                policy.assign_dice(game)
+                states.append(game.snapshot())
+            if game.game_state == "adventurer":
+                policy.play_turn(game)
+                states.append(game.snapshot())
+                if game.game_state == "adventurer":
+                    game.end_adventurer_turn()
+                    states.append(game.snapshot())
+            if game.game_state == "level_complete":
+                game.advance_level(policy.choose_upgrade(game))
+                states.append(game.snapshot())
+    return states
+
+class SectionTimer:
+    # Wraps renderer methods on the instance and adds up their time
+    def __init__(self):
+        self.totals = {}
+        self.calls = {}
+
+    def wrap(self, obj, method, name):
+        func = getattr(obj, method)
+        self.totals[name] = 0.0
+        self.calls[name] = 0
+
+        def timed(*args):
+            start = perf_counter()
+            result = func(*args)
+            self.totals[name] += perf_counter() - start
+            self.calls[name] += 1
+            return result
+        setattr(obj, method, timed)
+
+    def reset(self):
+        for name in self.totals:
+            self.totals[name] = 0.0
+            self.calls[name] = 0
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile of an already sorted list
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def run_scenario(scenario, frames, warmup, games, seed, page_frames):
+    module = load_script("One card dungeon tutorial.py" if scenario == "tutorial" else "One card dungeon.py")
+    module.init_display()
+    renderer = module.renderer
+    states = script_states(module.Game, games, seed)
+    game = module.Game(seed=0)
+
+    tutorial = None
+    timer = SectionTimer()
+    # The section list holds bound methods, rebuild it with the wrapped ones
+    for method, name in SECTIONS:
+        timer.wrap(renderer, method, name)
+    renderer.sections = [(rect, key_func, getattr(renderer, draw_func.__name__))
+                         for rect, key_func, draw_func in renderer.sections]
+    if scenario == "tutorial":
+        tutorial = module.Tutorial()
+        tutorial.toggle()
+        timer.wrap(tutorial, "draw_page", "tutorial page")
+    renderer.invalidate()
+
+    times = []
+    for frame in range(warmup + frames):
+        if frame == warmup:
+            timer.reset()
+        game.restore(states[frame % len(states)])
+        if tutorial is not None:
+            tutorial.current_page = (frame // page_frames) % len(tutorial.pages)
+        if scenario == "game-full":
+            renderer.invalidate()
+
+        start = perf_counter()
+        if tutorial is not None:
+            module.draw_game(game, None, tutorial)
+        else:
+            module.draw_game(game, None)
+        if frame >= warmup:
+            times.append(perf_counter() - start)
+
+    times.sort()
+    total = sum(times)
+    sections = {}
+    for name, seconds in timer.totals.items():
+        if name == "grid":
+            # draw_grid includes the sprites drawn by draw_entity
+            seconds -= timer.totals["entities"]
+        sections[name] = {
+            "repaints": timer.calls[name],
+            "ms_per_frame": seconds * 1000 / frames,
+            "share": seconds / total if total else 0.0,
+        }
+    # Whatever is left: clearing, key checks and pushing the frame to the display
+    other = total - sum(section["ms_per_frame"] for section in sections.values()) * frames / 1000
+    sections["other"] = {
+        "repaints": frames,
+        "ms_per_frame": other * 1000 / frames,
+        "share": other / total if total else 0.0,
+    }
+    return {
+        "frames": frames,
+        "states": len(states),
+        "p50_ms": percentile(times, 0.50) * 1000,
+        "p95_ms": percentile(times, 0.95) * 1000,
+        "p99_ms": percentile(times, 0.99) * 1000,
+        "max_ms": times[-1] * 1000,
+        "mean_ms": total * 1000 / frames,
+        "sections": sections,
+    }
+
+def print_report(scenario, result):
+    print(f"{scenario}: {result['frames']} frames over {result['states']} states")
+    print(f"  p50 {result['p50_ms']:.3f} ms  p95 {result['p95_ms']:.3f} ms  "
+          f"p99 {result['p99_ms']:.3f} ms  max {result['max_ms']:.3f} ms  mean {result['mean_ms']:.3f} ms")
+    for name, section in sorted(result["sections"].items(), key=lambda item: -item[1]["ms_per_frame"]):
+        print(f"  {name:>14}: {section['ms_per_frame']:8.4f} ms/frame  {section['share']:6.1%}  "
+              f"{section['repaints']} calls")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark draw_game on the dummy video driver")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--frames", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50, help="frames drawn before timing")
+    parser.add_argument("--games", type=int, default=3, help="seeded games to take the states from")
+    parser.add_argument("--seed", default="render")
+    parser.add_argument("--page-frames", type=int, default=25,
+                        help="tutorial scenario: frames before turning the page")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = {}
+    for scenario in scenarios:
+        results[scenario] = run_scenario(scenario, args.frames, args.warmup, args.games,
+                                         args.seed, args.page_frames)
+        print_report(scenario, results[scenario])
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Benchmarks for the hot paths of dungeon_core.
+
+Every run uses the same inputs: the four create_layout patterns (levels
+1-4), games made from fixed seeds on each of them and the adventurer put on
+a seeded random tile. Each benchmark prints operations per second, then a
+full turn and a full campaign number with the stairs policy.
+
+Every benchmark is called once before it is timed (caches, tables) and
+timed with the garbage collector off. The timing is the best of at least
+--repeat short runs (about SAMPLE_SECONDS each, for MEASURE_SECONDS in
+all): on a shared machine the speed changes from one moment to the next,
+and the best of many short runs spread over a while finds the quiet
+moments where a few long ones average the noise in. The numbers
+also move by tens of percent from one interpreter to the next (memory
+layout), so the suite runs in --processes fresh interpreters, one after
+the other, and keeps the best of all of them.
+
+    python benchmarks/bench_rules.py                        # print
+    python benchmarks/bench_rules.py --save baseline.json   # record
+    python benchmarks/bench_rules.py --compare benchmarks/baseline_rules.json
+
+--compare prints the ratio against the saved numbers and exits with 1 when
+something got slower than --tolerance (default 25%). Numbers depend on the
+machine: record a baseline on the same one before comparing.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import timeit
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dungeon_core import (GRID_SIZE, FLOOR_CODE, Game, DungeonLevel, has_line_of_sight,
+                          check_line, set_error_mode)
+from policies import get_policy
+from campaign import play_game
+
+LAYOUT_LEVELS = (1, 2, 3, 4)  # one level for each create_layout pattern
+SCENARIOS_PER_LAYOUT = 8
+CAMPAIGN_GAMES = 20
+SAMPLE_SECONDS = 0.01  # shortest timed run
+MEASURE_SECONDS = 1.0  # shortest time spent timing each benchmark
+
+def make_scenarios(seed):
+    # Games on each layout, adventurer moved to a free floor tile
+    scenarios = []
+    for level in LAYOUT_LEVELS:
+        for i in range(SCENARIOS_PER_LAYOUT):
+            game = Game(seed=f"{seed}-{level}-{i}")
+            while game.level < level:
+                game.advance_level("heal")
+            place = random.Random(f"{seed}-place-{level}-{i}")
+            free = [(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)
+                    if game.dungeon.tiles[y * GRID_SIZE + x] == FLOOR_CODE
+                    and game.occupancy.get(x, y) is None]
+            game.adventurer.x, game.adventurer.y = place.choice(free)
+            game.rebuild_occupancy()
+            scenarios.append(game)
+    return scenarios
+
+def layout_pairs():
+    # (dungeon, x1, y1, x2, y2) for every pair of non-wall tiles of each layout
+    pairs = []
+    for level in LAYOUT_LEVELS:
+        dungeon = DungeonLevel(level)
+        open_tiles = [(x, y) for y in range(GRID_SIZE) for x in range(GRID_SIZE)
+                      if not dungeon.is_wall(x, y)]
+        for x1, y1 in open_tiles:
+            for x2, y2 in open_tiles:
+                pairs.append((dungeon, x1, y1, x2, y2))
+    return pairs
+
+def build_benchmarks(seed):
+    # name -> (function, operations per call)
+    scenarios = make_scenarios(seed)
+    pairs = layout_pairs()
+    policy = get_policy("stairs")
+    benchmarks = {}
+
+    def line_of_sight():
+        for dungeon, x1, y1, x2, y2 in pairs:
+            has_line_of_sight(x1, y1, x2, y2, dungeon, ())
+    benchmarks["has_line_of_sight"] = (line_of_sight, len(pairs))
+
+    lines = [(dungeon, x1, y1, x2 + 1, y2 + 1) for dungeon, x1, y1, x2, y2 in pairs[::7]]
+    monsters = scenarios[0].monsters
+    def check_lines():
+        for dungeon, x1, y1, x2, y2 in lines:
+            check_line(x1, y1, x2, y2, dungeon, monsters)
+    benchmarks["check_line"] = (check_lines, len(lines))
+
+    # Monsters are looked up on every call: restore() replaces them. Each
+    # game passes its candidate cache, as process_monster_move does.
+    monster_count = sum(len(game.monsters) for game in scenarios)
+    def best_position():
+        for game in scenarios:
+            adventurer = game.adventurer
+            for monster in game.monsters:
+                monster.find_best_position(adventurer.x, adventurer.y, game.dungeon, adventurer,
+                                           game.monsters, game.occupancy, game.candidates)
+    benchmarks["Monster.find_best_position"] = (best_position, monster_count)
+
+    def monster_move():
+        for game in scenarios:
+            adventurer = game.adventurer
+            for monster in game.monsters:
+                x, y = monster.x, monster.y
+                monster.move(adventurer.x, adventurer.y, game.dungeon, adventurer,
+                             game.monsters, game.occupancy, game.candidates)
+                game.occupancy.move(monster, x, y)
+    benchmarks["Monster.move"] = (monster_move, monster_count)
+
+    # These change the game, so every call starts from a snapshot. The
+    # restore alone is timed too, to tell the two apart.
+    states = [(game, game.snapshot()) for game in scenarios]
+    def restore():
+        for game, state in states:
+            game.restore(state)
+    benchmarks["Game.restore"] = (restore, len(states))
+
+    def monster_turn():
+        for game, state in states:
+            game.restore(state)
+            game.process_monster_move()
+    benchmarks["Game.process_monster_move"] = (monster_turn, len(states))
+
+    def spawn():
+        for game, state in states:
+            game.spawn_monsters()
+    benchmarks["Game.spawn_monsters"] = (spawn, len(states))
+
+    def full_turn():
+        for game, state in states:
+            game.restore(state)
+            game.roll_energy_dice()
+            policy.assign_dice(game)
+            policy.play_turn(game)
+            if game.game_state == "adventurer":
+                game.end_adventurer_turn()
+    benchmarks["full turn (stairs)"] = (full_turn, len(states))
+
+    def campaign():
+        for i in range(CAMPAIGN_GAMES):
+            play_game(policy, seed=f"{seed}-campaign-{i}")
+    benchmarks["full campaign (stairs)"] = (campaign, CAMPAIGN_GAMES)
+
+    # Leave the scenarios as they were for the next benchmark
+    for game, state in states:
+        game.restore(state)
+    return benchmarks, states
+
+def run(seed, repeat, only=None):
+    benchmarks, states = build_benchmarks(seed)
+    results = {}
+    for name, (func, ops) in benchmarks.items():
+        if only and only not in name:
+            continue
+        func()  # warm-up: nothing built on the first call is timed
+        timer = timeit.Timer(func)
+        gc.collect()
+        gc.disable()
+        try:
+            # Calls per run: doubled until a run takes SAMPLE_SECONDS
+            number = 1
+            while timer.timeit(number) < SAMPLE_SECONDS:
+                number *= 2
+            times = []
+            end = perf_counter() + MEASURE_SECONDS
+            while len(times) < repeat or perf_counter() < end:
+                times.append(timer.timeit(number))
+            best = min(times)
+        finally:
+            gc.enable()
+        for game, state in states:
+            game.restore(state)
+        results[name] = ops * number / best
+    return results
+
+def run_processes(seed, repeat, only, processes):
+    # Best ops/s of each benchmark over fresh interpreters run in turn
+    results = {}
+    for _ in range(processes):
+        command = [sys.executable, os.path.abspath(__file__), "--child", "--seed", seed, "--repeat", str(repeat)]
+        if only:
+            command += ["--only", only]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        for name, ops in json.loads(output).items():
+            results[name] = max(ops, results.get(name, 0))
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dungeon_core hot paths")
+    parser.add_argument("--seed", default="bench")
+    parser.add_argument("--repeat", type=int, default=30, help="timed runs per benchmark, best counts")
+    parser.add_argument("--processes", type=int, default=3,
+                        help="interpreters the suite runs in, best of all of them")
+    parser.add_argument("--only", help="run only the benchmarks whose name contains this")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file written by --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="slowdown allowed by --compare before failing")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    set_error_mode("strict")
+    if args.child:
+        # One of the interpreters of run_processes: results on stdout
+        print(json.dumps(run(args.seed, args.repeat, args.only)))
+        return 0
+    if args.processes > 1:
+        results = run_processes(args.seed, args.repeat, args.only, args.processes)
+    else:
+        results = run(args.seed, args.repeat, args.only)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["ops_per_sec"]
+
+    slower = []
+    for name, ops in results.items():
+        line = f"{name:>28}: {ops:14,.0f} ops/s"
+        if baseline and name in baseline:
+            ratio = ops / baseline[name]
+            line += f"  {ratio:5.2f}x baseline"
+            if ratio < 1 - args.tolerance:
+                line += "  SLOWER"
+                slower.append(name)
+        print(line)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "seed": args.seed,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "ops_per_sec": results,
+            }, f, indent=2)
+    if slower:
+        print(f"{len(slower)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Game.snapshot/restore against copy.deepcopy.
+
+Plays a few games with the stairs policy, keeps the states met along the
+way and times branching from each one: deepcopy of the whole Game versus
+snapshot() plus restore() on the same game. Every restore is checked
+against the deepcopy before timing.
+
+    python benchmarks/bench_snapshot.py --games 20 --repeat 5
+"""
+import argparse
+import copy
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dungeon_core import Game, slot_names
+from policies import get_policy
+
+def collect_games(count, seed):
+    # One deepcopy of the game at the start of every adventurer turn
+    policy = get_policy("stairs")
+    games = []
+    for i in range(count):
+        game = Game(seed=f"{seed}-{i}")
+        while game.game_state not in ("game_over", "victory"):
+            if game.game_state == "energy":
+                game.roll_energy_dice()
+                policy.assign_dice(game)
+            if game.game_state == "adventurer":
+                games.append(copy.deepcopy(game))
+                policy.play_turn(game)
+                if game.game_state == "adventurer":
+                    game.end_adventurer_turn()
+            if game.game_state == "level_complete":
+                game.advance_level(policy.choose_upgrade(game))
+    return games
+
+def describe(game):
+    adventurer = game.adventurer
+    return (game.level, game.game_state, game.energy_dice, game.dice_assigned,
+            game.remaining_speed, game.remaining_attack, game.total_defense,
+            bytes(game.dungeon.tiles), game.rng.getstate(), len(game.actions),
+            [getattr(adventurer, name) for name in slot_names(type(adventurer))],
+            [(m.x, m.y, m.health, m.max_health) for m in game.monsters],
+            [i for i, entity in enumerate(game.occupancy.tiles) if entity is not None])
+
+def check(games):
+    # Play a turn from the snapshot, restore, and compare with a deepcopy
+    policy = get_policy("stairs")
+    for game in games:
+        expected = describe(copy.deepcopy(game))
+        state = game.snapshot()
+        policy.play_turn(game)
+        game.end_adventurer_turn()
+        game.restore(state)
+        if describe(game) != expected:
+            raise AssertionError("restore does not match the deepcopy")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Game.snapshot/restore")
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--seed", default="1")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    games = collect_games(args.games, args.seed)
+    check(games)
+
+    def deepcopy_all():
+        for game in games:
+            copy.deepcopy(game)
+
+    def snapshot_all():
+        for game in games:
+            game.restore(game.snapshot())
+
+    def snapshot_no_rng():
+        for game in games:
+            game.restore(game.snapshot(with_rng=False))
+
+    print(f"{len(games)} game states")
+    results = {}
+    for name, func in (("deepcopy", deepcopy_all), ("snapshot+restore", snapshot_all),
+                       ("without rng", snapshot_no_rng)):
+        best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+        results[name] = best / len(games)
+        print(f"{name:>18}: {results[name] * 1e6:8.1f} us per branch")
+    for name in ("snapshot+restore", "without rng"):
+        print(f"{name} speedup: {results['deepcopy'] / results[name]:.1f}x")
+
+if __name__ == "__main__":
+    main()
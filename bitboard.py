@@ -0,0 +1,150 @@
+"""Bitboards for the dungeon grid.
+
+A set of tiles is a Python int with bit (y * width + x) set for each tile,
+so on the 7x7 board the whole dungeon is a 49-bit number. Unions,
+intersections and "one step in every direction" are a few shifts and
+ands instead of loops over the tiles.
+
+Board holds the masks needed to shift without wrapping around the edges,
+plus per-tile range masks. Movement follows the game rules: an orthogonal
+step costs 2, a diagonal one 3.
+"""
+
+# Most range masks kept per board. The small boards fit whole, on big ones
+# the masks are cheap to rebuild and expensive to keep
+RANGE_MASK_CACHE = 4096
+
+def iter_bits(mask):
+    # Indices of the set bits, lowest first
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+class Board:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.size = width * height
+        self.full = (1 << self.size) - 1
+
+        left_column = 0
+        for y in range(height):
+            left_column |= 1 << (y * width)
+        right_column = left_column << (width - 1)
+        # Tiles that can still step east / west without leaving the row
+        self.not_right = self.full & ~right_column
+        self.not_left = self.full & ~left_column
+        self._range_masks = {}
+
+    def bit(self, x, y):
+        return 1 << (y * self.width + x)
+
+    def mask_of(self, tiles):
+        mask = 0
+        for x, y in tiles:
+            mask |= 1 << (y * self.width + x)
+        return mask
+
+    def position(self, index):
+        return index % self.width, index // self.width
+
+    def orthogonal(self, mask):
+        # Tiles one orthogonal step away from any tile of mask
+        width = self.width
+        return (((mask & self.not_right) << 1) | ((mask & self.not_left) >> 1)
+                | (mask << width) | (mask >> width)) & self.full
+
+    def diagonal(self, mask):
+        # Tiles one diagonal step away from any tile of mask
+        width = self.width
+        east = mask & self.not_right
+        west = mask & self.not_left
+        return ((east << (width + 1)) | (east >> (width - 1))
+                | (west << (width - 1)) | (west >> (width + 1))) & self.full
+
+    def cost_layers(self, start, passable, max_cost=None, stop=0, until=0):
+        # layers[c] = tiles whose cheapest path from start costs exactly c.
+        # Paths only cross passable tiles and don't go on from tiles in stop.
+        # With until, the last layer is the first one that holds one of its
+        # tiles.
+        layers = [start]
+        seen = start
+        cost = 0
+        # A layer can only come from the ones 2 or 3 cheaper, so three empty
+        # layers in a row mean nothing else is reachable
+        while max_cost is None or cost < max_cost:
+            cost += 1
+            grow = 0
+            if cost >= 2:
+                grow |= self.orthogonal(layers[cost - 2] & ~stop)
+            if cost >= 3:
+                grow |= self.diagonal(layers[cost - 3] & ~stop)
+            layer = grow & passable & ~seen
+            layers.append(layer)
+            seen |= layer
+            if layer & until:
+                break
+            if cost >= 3 and not (layer | layers[cost - 1] | layers[cost - 2]):
+                break
+        return layers
+
+    def reachable(self, start, passable, max_cost, stop=0):
+        # All tiles within max_cost of start (start included)
+        mask = 0
+        for layer in self.cost_layers(start, passable, max_cost, stop):
+            mask |= layer
+        return mask
+
+    def path_to(self, layers, target, stop=0):
+        # (dx, dy) steps of a cheapest path to the target tile index, walking
+        # the layers back from where the target was found (same stop as
+        # cost_layers)
+        width = self.width
+        cost = next(c for c, layer in enumerate(layers) if (layer >> target) & 1)
+        steps = []
+        tile = 1 << target
+        while cost > 0:
+            index = tile.bit_length() - 1
+            x, y = index % width, index // width
+            for step_cost, step in ((2, self.orthogonal), (3, self.diagonal)):
+                if cost >= step_cost:
+                    before = step(tile) & layers[cost - step_cost] & ~stop
+                    if before:
+                        previous = (before & -before).bit_length() - 1
+                        px, py = previous % width, previous // width
+                        steps.append((x - px, y - py))
+                        tile = 1 << previous
+                        cost -= step_cost
+                        break
+            else:
+                raise ValueError("tile not reachable through the layers")
+        steps.reverse()
+        return steps
+
+    def range_mask(self, index, max_range):
+        # Tiles within max_range of the tile (same metric as calculate_range),
+        # built one row at a time so big boards only pay for the rows in range
+        key = (index, max_range)
+        mask = self._range_masks.get(key)
+        if mask is None:
+            x1, y1 = self.position(index)
+            width = self.width
+            mask = 0
+            for dy in range(-(max_range // 2), max_range // 2 + 1):
+                y = y1 + dy
+                if not 0 <= y < self.height:
+                    continue
+                # Widest dx in range: past the diagonal the cost is dy + 2 * dx,
+                # before it 2 * dy + dx
+                ady = abs(dy)
+                if 3 * ady <= max_range:
+                    reach = (max_range - ady) // 2
+                else:
+                    reach = max_range - 2 * ady
+                left = max(0, x1 - reach)
+                right = min(width - 1, x1 + reach)
+                mask |= ((1 << (right - left + 1)) - 1) << (y * width + left)
+            if len(self._range_masks) < RANGE_MASK_CACHE:
+                self._range_masks[key] = mask
+        return mask
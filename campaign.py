@@ -0,0 +1,172 @@
+"""Monte Carlo campaign runner.
+
+Plays full 12-level games with one of the policies from policies.py,
+spread over a pool of worker processes, and prints how far the adventurer
+gets:
+
+    python campaign.py --policy stairs --games 10000 --workers 8 --seed 1
+
+Each game gets its own seeded random stream, so a run is reproducible for
+a given seed no matter how many workers are used.
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from dungeon_core import ERROR_MODES, Game, set_error_mode
+from policies import POLICIES, get_policy
+
+MAX_LEVEL = 12
+
+def game_seed(seed, game_index):
+    return f"{seed}-{game_index}"
+
+def play_game(policy, max_turns=1000, seed=None):
+    # Play one game to the end and describe how it went
+    game = Game(seed=seed)
+    turns = 0
+    while game.game_state not in ("game_over", "victory") and turns < max_turns:
+        if game.game_state == "energy":
+            game.roll_energy_dice()
+            policy.assign_dice(game)
+
+        if game.game_state == "adventurer":
+            policy.play_turn(game)
+            if game.game_state == "adventurer":
+                game.end_adventurer_turn()
+            turns += 1
+
+        if game.game_state == "level_complete":
+            game.advance_level(policy.choose_upgrade(game))
+
+    outcome = game.game_state if game.game_state in ("game_over", "victory") else "timeout"
+    return {
+        "outcome": outcome,
+        "level": min(game.level, MAX_LEVEL),
+        "turns": turns,
+        "health": game.adventurer.health,
+        "seed": game.seed,
+    }
+
+def run_games(policy_name, seed, game_indices, max_turns, error_mode="strict"):
+    # Worker entry point: play a chunk of games, one random stream each
+    set_error_mode(error_mode)
+    policy = get_policy(policy_name)
+    results = []
+    for game_index in game_indices:
+        result = play_game(policy, max_turns, game_seed(seed, game_index))
+        result["game"] = game_index
+        results.append(result)
+    return results
+
+class CampaignStats:
+    def __init__(self):
+        self.games = 0
+        self.outcomes = {"victory": 0, "game_over": 0, "timeout": 0}
+        self.deaths_by_level = [0] * (MAX_LEVEL + 1)
+        self.turns = 0
+
+    def add(self, result):
+        self.games += 1
+        self.outcomes[result["outcome"]] += 1
+        self.turns += result["turns"]
+        if result["outcome"] == "game_over":
+            self.deaths_by_level[result["level"]] += 1
+
+    def survival_curve(self):
+        # Fraction of games that got past each level
+        alive = self.games
+        curve = []
+        for level in range(1, MAX_LEVEL + 1):
+            alive -= self.deaths_by_level[level]
+            curve.append(alive / self.games if self.games else 0.0)
+        return curve
+
+    def to_dict(self):
+        return {
+            "games": self.games,
+            "outcomes": self.outcomes,
+            "win_rate": self.outcomes["victory"] / self.games if self.games else 0.0,
+            "mean_turns": self.turns / self.games if self.games else 0.0,
+            "deaths_by_level": self.deaths_by_level[1:],
+            "survival_by_level": self.survival_curve(),
+        }
+
+    def summary(self):
+        data = self.to_dict()
+        lines = [
+            f"Games: {self.games}  wins: {self.outcomes['victory']} ({data['win_rate']:.2%})  "
+            f"deaths: {self.outcomes['game_over']}  timeouts: {self.outcomes['timeout']}",
+            f"Mean turns: {data['mean_turns']:.1f}",
+            "Level  deaths  survived",
+        ]
+        for level, (deaths, alive) in enumerate(zip(data["deaths_by_level"], data["survival_by_level"]), start=1):
+            lines.append(f"{level:5d}  {deaths:6d}  {alive:8.2%}")
+        return "\n".join(lines)
+
+def chunks(count, size):
+    for start in range(0, count, size):
+        yield range(start, min(start + size, count))
+
+def run_campaign(policy_name, games, workers=1, seed=0, max_turns=1000, chunk_size=100, on_result=None,
+                 error_mode="strict"):
+    stats = CampaignStats()
+    if workers <= 1:
+        for indices in chunks(games, chunk_size):
+            for result in run_games(policy_name, seed, indices, max_turns, error_mode):
+                stats.add(result)
+                if on_result:
+                    on_result(result)
+        return stats
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(run_games, policy_name, seed, indices, max_turns, error_mode)
+                   for indices in chunks(games, chunk_size)]
+        # Results are folded in as soon as each chunk is done
+        for future in as_completed(futures):
+            for result in future.result():
+                stats.add(result)
+                if on_result:
+                    on_result(result)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many One Card Dungeon games with an automatic policy.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="stairs")
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--error-mode", choices=ERROR_MODES, default="strict",
+                        help="strict: stop on the first rules error, debug: count errors and go on")
+    parser.add_argument("--results", help="write one JSON line per game to this file")
+    parser.add_argument("--json", help="write the aggregated statistics to this file")
+    args = parser.parse_args()
+
+    results_file = open(args.results, "w") if args.results else None
+    def on_result(result):
+        if results_file:
+            results_file.write(json.dumps(result) + "\n")
+
+    start = time.perf_counter()
+    try:
+        stats = run_campaign(args.policy, args.games, args.workers, args.seed,
+                             args.max_turns, args.chunk_size, on_result, args.error_mode)
+    finally:
+        if results_file:
+            results_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Policy: {args.policy}  workers: {args.workers}  time: {elapsed:.2f}s "
+          f"({stats.games / max(elapsed, 1e-9):.0f} games/s)")
+    print(stats.summary())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(stats.to_dict(), f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
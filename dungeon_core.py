@@ -0,0 +1,1508 @@
+"""Pure game rules for One Card Dungeon.
+
+Everything in here runs without pygame, so it can be imported by the
+interactive scripts as well as by headless simulations.
+"""
+import random
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from enum import Enum
+from heapq import heappop, heappush
+from operator import attrgetter
+import traceback  # Aggiungiamo questo per il debug
+
+from bitboard import Board, iter_bits
+
+# Constants
+GRID_SIZE = 7  # 6x6 grid for the dungeon
+UNREACHABLE = 10 ** 9  # Distance of tiles that can't be reached
+
+# Tile sets as ints, bit y * width + x (see bitboard.py), one Board per size
+_boards = {}
+
+def get_board(width, height):
+    board = _boards.get((width, height))
+    if board is None:
+        board = _boards[(width, height)] = Board(width, height)
+    return board
+
+BOARD = get_board(GRID_SIZE, GRID_SIZE)
+
+# Boards up to this many tiles get whole tables per layout (visibility and
+# range between every pair of tiles, full distance fields). Bigger ones work
+# out what a turn needs on the spot, so the cost grows with the area around
+# the entities rather than with the square of the board.
+SMALL_BOARD_TILES = 100
+
+# Neighbour moves: orthogonal cost 2, diagonal cost 3
+MOVES = [(0, -1, 2), (1, 0, 2), (0, 1, 2), (-1, 0, 2), (-1, -1, 3), (1, -1, 3), (1, 1, 3), (-1, 1, 3)]
+
+# Error handling. The helpers called thousands of times per turn (line of
+# sight, ranges, monster steps) have no try/except of their own; errors are
+# caught once per game phase and handed to report_error. In "debug" mode
+# (the default) the game goes on: every kind of error is counted in
+# error_counts and printed the first time only. In "strict" mode errors
+# propagate, which is what simulations want: a bug stops the run instead of
+# quietly changing the results.
+ERROR_MODES = ("debug", "strict")
+error_mode = "debug"
+error_counts = Counter()  # (where, exception name) -> count
+
+def set_error_mode(mode):
+    global error_mode
+    if mode not in ERROR_MODES:
+        raise ValueError(f"unknown error mode {mode!r}, expected one of {ERROR_MODES}")
+    error_mode = mode
+
+def report_error(where, error):
+    # Called from an except block: re-raises in strict mode
+    if error_mode == "strict":
+        raise error
+    key = (where, type(error).__name__)
+    error_counts[key] += 1
+    if error_counts[key] == 1:
+        print(f"Errore in {where}: {error}")
+        traceback.print_exc()
+
+def error_summary():
+    return [{"where": where, "error": name, "count": count}
+            for (where, name), count in error_counts.most_common()]
+
+# Direction enums
+class Direction(Enum):
+    NORTH = 0
+    EAST = 1
+    SOUTH = 2
+    WEST = 3
+
+# Tile types
+class TileType(Enum):
+    FLOOR = 0
+    WALL = 1
+    STAIRS = 2
+
+# Tile codes as stored in DungeonLevel.tiles
+FLOOR_CODE = TileType.FLOOR.value
+WALL_CODE = TileType.WALL.value
+STAIRS_CODE = TileType.STAIRS.value
+TILE_TYPES = tuple(sorted(TileType, key=lambda t: t.value))
+
+# Bits of the wall tiles, for rebuilding the masks from a tile bytearray
+_WALL_BITS = bytes(ord("1") if code == WALL_CODE else ord("0") for code in range(256))
+
+# Inner walls of the four level patterns, as (x, y) on the 7x7 board. On
+# bigger boards each of the 5x5 inner cells is stretched to a block of tiles.
+LAYOUT_WALLS = {
+    1: ((2, 2), (3, 2), (3, 3)),                          # Levels 1, 5, 9
+    2: ((3, 1), (3, 2), (2, 3), (4, 3)),                  # Levels 2, 6, 10
+    3: ((1, 2), (4, 2), (2, 3), (3, 3), (3, 4)),          # Levels 3, 7, 11
+    0: ((2, 1), (2, 2), (4, 2), (1, 3), (3, 4), (4, 4)),  # Levels 4, 8, 12
+}
+
+class GridRow:
+    # One row of GridView, reads and writes go to the dungeon's tiles
+    __slots__ = ("dungeon", "y")
+    
+    def __init__(self, dungeon, y):
+        self.dungeon = dungeon
+        self.y = y
+        
+    def __getitem__(self, x):
+        if not 0 <= x < self.dungeon.width:
+            raise IndexError(x)
+        return TILE_TYPES[self.dungeon.tiles[self.y * self.dungeon.width + x]]
+        
+    def __setitem__(self, x, tile):
+        if not 0 <= x < self.dungeon.width:
+            raise IndexError(x)
+        self.dungeon.set_tile(x, self.y, tile)
+        
+    def __len__(self):
+        return self.dungeon.width
+
+class GridView:
+    """grid[y][x] access to DungeonLevel.tiles, returning TileType members.
+    
+    Kept for readable code outside the hot paths; those use the tile codes
+    and the wall/walkable bitmasks directly.
+    """
+    __slots__ = ("rows",)
+    
+    def __init__(self, dungeon):
+        self.rows = [GridRow(dungeon, y) for y in range(dungeon.height)]
+        
+    def __getitem__(self, y):
+        return self.rows[y]
+        
+    def __len__(self):
+        return len(self.rows)
+        
+    def __iter__(self):
+        return iter(self.rows)
+
+class DungeonLevel:
+    def __init__(self, level_number, width=GRID_SIZE, height=GRID_SIZE, layout=None):
+        if width < GRID_SIZE or height < GRID_SIZE:
+            raise ValueError(f"dungeon must be at least {GRID_SIZE}x{GRID_SIZE}, got {width}x{height}")
+        self.level_number = level_number
+        self.width = width
+        self.height = height
+        self.board = get_board(width, height)
+        # Range between every pair of tiles, only kept for small boards
+        self.range_matrix = get_range_matrix(width, height) if width * height <= SMALL_BOARD_TILES else None
+        # One byte per tile (a TileType value), indexed by y * width + x,
+        # plus bitmasks of the wall and walkable tiles with the same indices
+        self.tiles = bytearray(width * height)
+        self.wall_mask = 0
+        self.walkable_mask = self.board.full
+        self.grid = GridView(self)
+        self.monster_data = self.get_monster_data()
+        self._visibility = None
+        self._distance_fields = None
+        self._layout_index = None
+        if layout is None:
+            self.create_layout()
+        else:
+            # Tiles made elsewhere (see layouts.py), one TileType value per byte
+            if len(layout) != width * height:
+                raise ValueError(f"layout has {len(layout)} tiles, the dungeon {width * height}")
+            self.tiles[:] = layout
+            self.update_masks()
+        
+    def set_tile(self, x, y, tile):
+        index = y * self.width + x
+        bit = 1 << index
+        self.tiles[index] = tile.value
+        if tile == TileType.WALL:
+            self.wall_mask |= bit
+            self.walkable_mask &= ~bit
+        else:
+            self.wall_mask &= ~bit
+            self.walkable_mask |= bit
+        # Cached tables belong to the old layout
+        self._visibility = None
+        self._distance_fields = None
+        self._layout_index = None
+        
+    def update_masks(self):
+        # Masks from scratch after writing to self.tiles directly: one pass
+        # instead of a big-int update per tile
+        walls = bytes(self.tiles).translate(_WALL_BITS)
+        self.wall_mask = int(walls[::-1], 2)
+        self.walkable_mask = self.board.full & ~self.wall_mask
+        self._visibility = None
+        self._distance_fields = None
+        self._layout_index = None
+        
+    def is_wall(self, x, y):
+        return self.tiles[y * self.width + x] == WALL_CODE
+        
+    def copy(self):
+        # Same layout and monsters without building it again, caches are shared
+        dungeon = DungeonLevel.__new__(DungeonLevel)
+        dungeon.level_number = self.level_number
+        dungeon.width = self.width
+        dungeon.height = self.height
+        dungeon.board = self.board
+        dungeon.range_matrix = self.range_matrix
+        dungeon.tiles = bytearray(self.tiles)
+        dungeon.wall_mask = self.wall_mask
+        dungeon.walkable_mask = self.walkable_mask
+        dungeon.grid = GridView(dungeon)
+        dungeon.monster_data = list(self.monster_data)
+        dungeon._visibility = self._visibility
+        dungeon._distance_fields = self._distance_fields
+        dungeon._layout_index = self._layout_index
+        return dungeon
+        
+    @property
+    def layout_key(self):
+        # Layouts are static once created, so the size and tiles identify them
+        return (self.width, bytes(self.tiles))
+        
+    @property
+    def visibility(self):
+        if self._visibility is None:
+            self._visibility = get_visibility_table(self)
+        return self._visibility
+        
+    @property
+    def layout_index(self):
+        # Connectivity and spawn tiles of the layout (shared per layout)
+        if self._layout_index is None:
+            self._layout_index = get_layout_index(self.tiles, self.width, self.height)
+        return self._layout_index
+        
+    def distance_field(self, target_x, target_y):
+        # Movement cost from every tile to the target (shared per layout)
+        if self._distance_fields is None:
+            self._distance_fields = _distance_fields.get(self.layout_key, dict)
+        field = self._distance_fields.get((target_x, target_y))
+        if field is None:
+            field = compute_distance_field(self, target_x, target_y)
+            self._distance_fields[(target_x, target_y)] = field
+        return field
+        
+    def walk_field(self, target_x, target_y, from_x, from_y, speed, blocked=()):
+        # Field for walking up to speed from (from_x, from_y) down to the
+        # target. Small boards use the cached full field, big ones only search
+        # the tiles that walk can reach (see bounded_distance_field). A field
+        # that also goes around the blocked tiles is made for this walk only.
+        if self.width * self.height <= SMALL_BOARD_TILES:
+            if blocked:
+                return compute_distance_field(self, target_x, target_y, blocked, (from_x, from_y))
+            return self.distance_field(target_x, target_y)
+        return bounded_distance_field(self, target_x, target_y, from_x, from_y, speed, blocked)
+        
+    def ranges_from(self, x, y):
+        # Range from (x, y) to every tile, indexed like the tiles
+        if self.range_matrix is not None:
+            return self.range_matrix[y * self.width + x]
+        return RangeRow(x, y, self.width)
+        
+    def get_monster_data(self):
+        # Monster data by level: [count, health, speed, attack, defense, range]
+        monster_data = {
+            1: [2, 2, 5, 4, 1, 3, "Spider"],
+            2: [2, 3, 4, 5, 1, 2, "Goblin"],
+            3: [2, 3, 5, 4, 2, 3, "Skeleton"],
+            4: [3, 3, 4, 5, 2, 3, "Zombie"],
+            5: [2, 4, 5, 5, 2, 4, "Orc"],
+            6: [2, 4, 6, 5, 3, 3, "Wolf"],
+            7: [3, 4, 5, 6, 3, 4, "Ghoul"],
+            8: [2, 5, 5, 6, 3, 4, "Troll"],
+            9: [2, 5, 6, 6, 3, 5, "Ghost"],
+            10: [3, 5, 6, 7, 4, 4, "Vampire"],
+            11: [2, 6, 6, 7, 4, 5, "Golem"],
+            12: [3, 6, 7, 8, 4, 5, "Dragon"],
+        }
+        return monster_data.get(self.level_number, [2, 2, 5, 4, 1, 3, "Monster"])
+    
+    def create_layout(self):
+        width, height = self.width, self.height
+        tiles = self.tiles
+        
+        # Add walls around border
+        for x in range(width):
+            tiles[x] = WALL_CODE
+            tiles[(height - 1) * width + x] = WALL_CODE
+        for y in range(height):
+            tiles[y * width] = WALL_CODE
+            tiles[y * width + width - 1] = WALL_CODE
+            
+        # Add inner walls based on level, cell c of the 7x7 pattern covering
+        # tiles 1 + (c - 1) * inner // 5 up to 1 + c * inner // 5
+        for cx, cy in LAYOUT_WALLS[self.level_number % 4]:
+            for y in range(1 + (cy - 1) * (height - 2) // 5, 1 + cy * (height - 2) // 5):
+                row = y * width
+                for x in range(1 + (cx - 1) * (width - 2) // 5, 1 + cx * (width - 2) // 5):
+                    tiles[row + x] = WALL_CODE
+                    
+        # Add stairs
+        tiles[(height - 2) * width + width - 2] = STAIRS_CODE
+        self.update_masks()
+
+class TargetRings:
+    """Tiles a monster can stand on to shoot the adventurer, best first.
+
+    rings are bitmasks of walkable tiles with line of sight to the
+    adventurer's tile, one per range from it, in the order a monster with
+    this range wants them: the range itself, then closer in, then (only if
+    all of those are taken) further out. Line of sight only depends on the
+    walls, so who stands where is left to the monster to mask out. Rings are
+    worked out the first time a monster gets to them.
+    """
+    __slots__ = ("dungeon", "adv_index", "rings", "inner", "inner_mask", "outer", "outer_mask")
+    
+    def __init__(self, dungeon, adv_index, monster_range):
+        self.dungeon = dungeon
+        self.adv_index = adv_index
+        self.rings = []
+        # Range of the last ring going in and going out, with the mask of
+        # the tiles within it
+        self.inner = self.outer = monster_range
+        self.inner_mask = self.outer_mask = dungeon.board.range_mask(adv_index, monster_range)
+        
+    def next_hit(self, free):
+        # Rings after the ones so far, until one has a free tile
+        dungeon = self.dungeon
+        board = dungeon.board
+        adv_index = self.adv_index
+        while True:
+            if self.inner >= 0:
+                self.inner -= 1
+                inside = board.range_mask(adv_index, self.inner) if self.inner >= 0 else 0
+                tiles = self.inner_mask & ~inside
+                self.inner_mask = inside
+            elif self.outer < range_between(0, 0, dungeon.width - 1, dungeon.height - 1):
+                self.outer += 1
+                inside = board.range_mask(adv_index, self.outer)
+                tiles = inside & ~self.outer_mask
+                self.outer_mask = inside
+            else:
+                return 0
+            ring = dungeon.visibility.seen_within(adv_index, dungeon.walkable_mask & tiles)
+            if ring:
+                self.rings.append(ring)
+                if ring & free:
+                    return ring & free
+
+class CandidateCache:
+    """TargetRings for the adventurer's tile, kept while it stays there.
+
+    Every monster of a turn looks for a tile against the same adventurer,
+    so the rings are worked out once per turn and range. The key is the
+    adventurer's tile and the layout (its visibility table). Occupancy isn't
+    part of it: each monster masks the taken tiles out itself, so the moves
+    of the monsters before it don't throw the rings away.
+    """
+    __slots__ = ("visibility", "adv_index", "by_range")
+    
+    def __init__(self):
+        self.visibility = None
+        self.adv_index = None
+        self.by_range = {}
+        
+    def rings(self, dungeon, adv_index, monster_range):
+        visibility = dungeon.visibility
+        if visibility is not self.visibility or adv_index != self.adv_index:
+            self.visibility = visibility
+            self.adv_index = adv_index
+            self.by_range = {}
+        rings = self.by_range.get(monster_range)
+        if rings is None:
+            rings = self.by_range[monster_range] = TargetRings(dungeon, adv_index, monster_range)
+        return rings
+
+class Monster:
+    # No per-instance dict: simulations keep a lot of these around
+    __slots__ = ("x", "y", "health", "max_health", "speed", "attack", "defense", "range", "name")
+    
+    def __init__(self, x, y, health, speed, attack, defense, range_val, name):
+        self.x = x
+        self.y = y
+        self.health = health
+        self.max_health = health
+        self.speed = speed
+        self.attack = attack
+        self.defense = defense
+        self.range = range_val
+        self.name = name
+        
+    def move(self, target_x, target_y, dungeon, adventurer, other_monsters, occupancy=None, candidates=None):
+        # Errors are handled by the caller (Game.process_monster_move, one
+        # monster at a time)
+        # Calculate path to best position (at maximum range with line of sight)
+        best_position = self.find_best_position(target_x, target_y, dungeon, adventurer, other_monsters,
+                                                occupancy, candidates)
+        if best_position is None:
+            return False  # Can't move
+            
+        # Walk down the distance field of the best position. The cached field
+        # only knows the walls: if a tile it leads to is taken, walk again
+        # from the start on a field that goes around the adventurer and the
+        # other monsters. With no way round, the first walk gets as close as
+        # it can.
+        best_x, best_y = best_position
+        field = dungeon.walk_field(best_x, best_y, self.x, self.y, self.speed)
+        current_x, current_y, diverted = self.walk(field, dungeon, adventurer, other_monsters, occupancy)
+        if diverted:
+            taken = [(m.x, m.y) for m in other_monsters if m is not self]
+            taken.append((adventurer.x, adventurer.y))
+            field = dungeon.walk_field(best_x, best_y, self.x, self.y, self.speed, taken)
+            if field[self.y * dungeon.width + self.x] < UNREACHABLE:
+                current_x, current_y, _ = self.walk(field, dungeon, adventurer, other_monsters, occupancy)
+                
+        if occupancy is not None:
+            occupancy.move(self, current_x, current_y)
+        else:
+            self.x, self.y = current_x, current_y
+        return True
+        
+    def find_best_position(self, target_x, target_y, dungeon, adventurer, other_monsters, occupancy=None, candidates=None):
+        # Find tiles at maximum range from adventurer with line of sight
+        width = dungeon.width
+        adv_x, adv_y = adventurer.x, adventurer.y
+        adv_index = adv_y * width + adv_x
+        self_x, self_y = self.x, self.y
+        
+        # Tiles taken by the adventurer or another monster
+        if occupancy is not None:
+            taken = occupancy.mask & ~(1 << (self_y * width + self_x))
+        else:
+            taken = 0
+            for m in other_monsters:
+                if m != self:
+                    taken |= 1 << (m.y * width + m.x)
+        taken |= 1 << adv_index
+        free = dungeon.walkable_mask & ~taken
+        
+        # Tiles with line of sight to the adventurer, best ring first (see
+        # TargetRings): the first ring with a free tile has the candidates
+        if candidates is not None:
+            rings = candidates.rings(dungeon, adv_index, self.range)
+        else:
+            rings = TargetRings(dungeon, adv_index, self.range)
+        hits = 0
+        for ring in rings.rings:
+            hits = ring & free
+            if hits:
+                break
+        else:
+            hits = rings.next_hit(free)
+            
+        # Closest to the monster (ties in column order, as the old tile scan did)
+        ranges = dungeon.range_matrix
+        if ranges is not None:
+            from_self = ranges[self_y * width + self_x]
+        else:
+            from_self = RangeRow(self_x, self_y, width)
+        best = None
+        for index in iter_bits(hits):
+            key = (from_self[index], index % width, index // width)
+            if best is None or key < best:
+                best = key
+        if best is not None:
+            return (best[1], best[2])
+        return None  # Return None if no valid positions
+        
+    def walk(self, field, dungeon, adventurer, other_monsters, occupancy=None):
+        # Steps down field from the monster's tile while the speed lasts:
+        # (x, y, diverted), diverted when a taken tile is on the way the field
+        # alone would take
+        remaining_speed = self.speed
+        current_x, current_y = self.x, self.y
+        diverted = False
+        
+        while remaining_speed > 0:
+            next_step = self.downhill_step(current_x, current_y, field, remaining_speed, dungeon)
+            if next_step is None:
+                break
+            if not self.is_valid_move(next_step[0], next_step[1], dungeon, adventurer, other_monsters, occupancy):
+                diverted = True
+                next_step = self.get_next_step(current_x, current_y, field, remaining_speed, dungeon, adventurer, other_monsters, occupancy)
+                if next_step is None:
+                    break
+                    
+            next_x, next_y, cost = next_step
+            current_x, current_y = next_x, next_y
+            remaining_speed -= cost
+            
+        # A taken tile further down the way counts too: the walk is heading
+        # for it. Only tiles closer to the target than the end can be on it.
+        if diverted or not self.taken_ahead(field, current_x, current_y, dungeon, adventurer, other_monsters):
+            return current_x, current_y, diverted
+        x, y = current_x, current_y
+        while not diverted:
+            next_step = self.downhill_step(x, y, field, UNREACHABLE, dungeon)
+            if next_step is None:
+                break
+            x, y = next_step[0], next_step[1]
+            diverted = not self.is_valid_move(x, y, dungeon, adventurer, other_monsters, occupancy)
+            
+        return current_x, current_y, diverted
+        
+    def taken_ahead(self, field, x, y, dungeon, adventurer, other_monsters):
+        # Whether the adventurer or another monster is closer to the target
+        # than (x, y) on field
+        width = dungeon.width
+        here = field[y * width + x]
+        if field[adventurer.y * width + adventurer.x] < here:
+            return True
+        for m in other_monsters:
+            if m is not self and field[m.y * width + m.x] < here:
+                return True
+        return False
+        
+    def downhill_step(self, from_x, from_y, field, remaining_speed, dungeon):
+        # Affordable neighbour that gets closest to the target, taken or not
+        # (get_next_step when it is free: same order, same ties)
+        width, height = dungeon.width, dungeon.height
+        here = field[from_y * width + from_x]
+        best = None
+        best_total = UNREACHABLE
+        
+        for dx, dy, cost in MOVES:
+            if cost > remaining_speed:
+                continue
+            nx, ny = from_x + dx, from_y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                distance = field[ny * width + nx]
+                if distance < here and distance + cost < best_total:
+                    best = (nx, ny, cost)
+                    best_total = distance + cost
+                    
+        return best
+        
+    def get_next_step(self, from_x, from_y, field, remaining_speed, dungeon, adventurer, other_monsters, occupancy=None):
+        # Get the affordable free neighbour that gets closest to the target
+        width, height = dungeon.width, dungeon.height
+        here = field[from_y * width + from_x]
+        best = None
+        
+        for dx, dy, cost in MOVES:
+            if cost > remaining_speed:
+                continue
+            nx, ny = from_x + dx, from_y + dy
+            if not (0 <= nx < width and 0 <= ny < height):
+                continue
+                
+            # Only steps that get closer, shortest path first
+            distance = field[ny * width + nx]
+            if distance < here and (best is None or distance + cost < best[3]):
+                if self.is_valid_move(nx, ny, dungeon, adventurer, other_monsters, occupancy):
+                    best = (nx, ny, cost, distance + cost)
+                    
+        if best:
+            return best[:3]
+        return None
+        
+    def is_valid_move(self, x, y, dungeon, adventurer, other_monsters, occupancy=None):
+        # Check bounds
+        if x < 0 or y < 0 or x >= dungeon.width or y >= dungeon.height:
+            return False
+            
+        # Check for walls
+        if dungeon.tiles[y * dungeon.width + x] == WALL_CODE:
+            return False
+            
+        # Check for adventurer and other monsters in one lookup
+        if occupancy is not None:
+            occupant = occupancy.get(x, y)
+            return occupant is None or occupant is self
+            
+        # Check for adventurer
+        if x == adventurer.x and y == adventurer.y:
+            return False
+            
+        # Check for other monsters
+        for m in other_monsters:
+            if m != self and m.x == x and m.y == y:
+                return False
+                
+        return True
+        
+    def can_attack(self, target_x, target_y, other_monsters, dungeon):
+        # Check if can attack (in range and line of sight)
+        range_to_target = calculate_range(self.x, self.y, target_x, target_y)
+        return range_to_target <= self.range and has_line_of_sight(self.x, self.y, target_x, target_y, dungeon, other_monsters)
+
+class Adventurer:
+    # Subclasses adding attributes must list them in their own __slots__
+    __slots__ = ("x", "y", "health", "max_health", "speed", "attack", "defense", "range",
+                 "class_name", "class_ability_used")
+    
+    def __init__(self):
+        self.x = 1
+        self.y = 1
+        self.health = 6
+        self.max_health = 6
+        self.speed = 1
+        self.attack = 1
+        self.defense = 1
+        self.range = 2
+        self.class_name = None
+        self.class_ability_used = False
+        
+    def move(self, dx, dy, dungeon, monsters, remaining_speed, occupancy=None):
+        new_x = self.x + dx
+        new_y = self.y + dy
+        
+        # Check bounds
+        if new_x < 0 or new_y < 0 or new_x >= dungeon.width or new_y >= dungeon.height:
+            return False, remaining_speed
+            
+        # Check for walls
+        index = new_y * dungeon.width + new_x
+        if dungeon.tiles[index] == WALL_CODE:
+            return False, remaining_speed
+            
+        # Check for monsters
+        if occupancy is not None:
+            if occupancy.tiles[index] is not None:
+                return False, remaining_speed
+        else:
+            for monster in monsters:
+                if monster.x == new_x and monster.y == new_y:
+                    return False, remaining_speed
+                
+        # Calculate cost (2 for orthogonal, 3 for diagonal)
+        cost = 2 if dx == 0 or dy == 0 else 3
+        
+        # Check if enough speed points
+        if cost > remaining_speed:
+            return False, remaining_speed
+            
+        # Move
+        if occupancy is not None:
+            occupancy.move(self, new_x, new_y)
+        else:
+            self.x = new_x
+            self.y = new_y
+        return True, remaining_speed - cost
+        
+    def upgrade_skill(self, skill):
+        if skill == "speed":
+            self.speed += 1
+        elif skill == "attack":
+            self.attack += 1
+        elif skill == "defense":
+            self.defense += 1
+        elif skill == "range":
+            self.range += 1
+            
+    def heal_full(self):
+        self.health = self.max_health
+        
+    def use_class_ability(self, ability_type, energy_dice=None):
+        if self.class_ability_used:
+            return False
+            
+        self.class_ability_used = True
+        return True
+
+class OccupancyGrid:
+    """Entity standing on each tile (adventurer or monster), or None.
+
+    Game keeps it up to date on every move, spawn and kill, so "is this
+    tile taken?" is a single lookup instead of a scan of the monster list.
+    """
+    __slots__ = ("width", "tiles", "mask")
+    
+    def __init__(self, width=GRID_SIZE, height=GRID_SIZE):
+        self.width = width
+        self.tiles = [None] * (width * height)
+        self.mask = 0  # bitboard of the occupied tiles
+        
+    def get(self, x, y):
+        return self.tiles[y * self.width + x]
+        
+    def is_occupied(self, x, y):
+        return self.tiles[y * self.width + x] is not None
+        
+    def place(self, entity):
+        index = entity.y * self.width + entity.x
+        self.tiles[index] = entity
+        self.mask |= 1 << index
+        
+    def remove(self, entity):
+        index = entity.y * self.width + entity.x
+        if self.tiles[index] is entity:
+            self.tiles[index] = None
+            self.mask &= ~(1 << index)
+            
+    def move(self, entity, x, y):
+        self.remove(entity)
+        entity.x, entity.y = x, y
+        self.place(entity)
+        
+    def clear(self):
+        self.tiles = [None] * len(self.tiles)
+        self.mask = 0
+
+def slot_names(cls):
+    # Every __slots__ entry of cls and of its bases, bases first
+    names = _slot_names.get(cls)
+    if names is None:
+        names = tuple(name for klass in reversed(cls.__mro__) for name in klass.__dict__.get("__slots__", ()))
+        _slot_names[cls] = names
+    return names
+
+_slot_names = {}
+
+# Plain Game attributes saved by Game.snapshot
+GAME_FIELDS = ("level", "game_state", "dice_rolled", "total_speed", "total_attack", "total_defense",
+               "remaining_speed", "remaining_attack", "message", "last_message")
+_game_state = attrgetter(*GAME_FIELDS)
+_monster_state = attrgetter(*Monster.__slots__)
+
+class Game:
+    # Subclasses (e.g. the tutorial) can swap in their own Adventurer
+    adventurer_class = Adventurer
+
+    def __init__(self, seed=None, width=GRID_SIZE, height=GRID_SIZE, layouts=None):
+        # Every game has its own random stream, so the seed plus the action
+        # log is enough to play it again (see replay.py)
+        self.seed = seed if seed is not None else random.randrange(1 << 32)
+        self.width = width
+        self.height = height
+        # Pool of generated layouts (layouts.LayoutPool), None for the
+        # four fixed patterns
+        if layouts is not None and (layouts.width, layouts.height) != (width, height):
+            raise ValueError(f"layouts are {layouts.width}x{layouts.height}, the board is {width}x{height}")
+        self.layouts = layouts
+        self.rng = random.Random(self.seed)
+        self.actions = []
+        self.level = 1
+        self.adventurer = self.adventurer_class()
+        self.dungeon = self.new_dungeon()
+        self.monsters = []
+        self.occupancy = OccupancyGrid(width, height)
+        self.candidates = CandidateCache()  # where monsters can shoot from
+        self.spawn_monsters()
+        self.game_state = "energy"  # energy, adventurer, monster_move, monster_attack, level_complete, game_over, victory
+        self.energy_dice = [1, 1, 1]
+        self.dice_rolled = False  # energy_dice hold this turn's roll
+        self.total_speed = 0
+        self.total_attack = 0
+        self.total_defense = 0
+        self.remaining_speed = 0
+        self.remaining_attack = 0
+        self.message = "Welcome to One Card Dungeon! Roll energy dice to begin."
+        self.last_message = ""
+        self.dice_assigned = [False, False, False]
+        
+    def new_dungeon(self):
+        # Level self.level, from the layout pool if the game has one
+        layout = self.layouts.pick(self.rng) if self.layouts is not None else None
+        dungeon = DungeonLevel(self.level, self.width, self.height, layout)
+        if not dungeon.layout_index.stairs_reachable:
+            raise ValueError(f"level {self.level}: the stairs can't be reached from the start")
+        return dungeon
+        
+    def spawn_monsters(self):
+        try:
+            self.monsters.clear()
+            monster_count, health, speed, attack, defense, range_val, name = self.dungeon.monster_data
+            
+            # Create monsters
+            for x, y in self.spawn_positions(monster_count):
+                self.monsters.append(Monster(x, y, health, speed, attack, defense, range_val, name))
+                
+            self.rebuild_occupancy()
+        except Exception as e:
+            report_error("spawn_monsters", e)
+            
+    def spawn_positions(self, count):
+        # Up to count random floor tiles that can be walked to from the start,
+        # away from the adventurer. The candidates come from the layout index;
+        # small boards shuffle all of them, big ones draw just count.
+        dungeon = self.dungeon
+        index = dungeon.layout_index
+        adv_x, adv_y = self.adventurer.x, self.adventurer.y
+        if (adv_x, adv_y) == (1, 1):
+            positions = list(index.spawn_tiles)
+        else:
+            # Don't spawn next to the adventurer wherever it is
+            positions = [(x, y) for x, y in index.floor_tiles if abs(x - adv_x) > 1 or abs(y - adv_y) > 1]
+            
+        if dungeon.width * dungeon.height > SMALL_BOARD_TILES:
+            return self.rng.sample(positions, min(count, len(positions)))
+        self.rng.shuffle(positions)
+        return positions[:count]
+        
+    def rebuild_occupancy(self):
+        # Needed only when entities are moved without going through Game
+        self.occupancy.clear()
+        self.occupancy.place(self.adventurer)
+        for monster in self.monsters:
+            self.occupancy.place(monster)
+            
+    def snapshot(self, with_rng=True):
+        # Immutable copy of everything play can change, for restore(). The
+        # DungeonLevel is kept by reference: layouts never change once built.
+        # Copying the random state is most of the cost; searches that pick
+        # the dice themselves can leave it out.
+        adventurer = self.adventurer
+        return (
+            _game_state(self),
+            tuple(self.energy_dice),
+            tuple(self.dice_assigned),
+            self.dungeon,
+            tuple([getattr(adventurer, name) for name in slot_names(type(adventurer))]),
+            tuple([_monster_state(monster) for monster in self.monsters]),
+            self.rng.getstate() if with_rng else None,
+            len(self.actions),
+        )
+        
+    def restore(self, state):
+        # Go back to a snapshot() of this game. Monsters are new objects, so
+        # references to the old ones are stale afterwards.
+        game_values, dice, assigned, dungeon, adventurer_values, monster_values, rng_state, action_count = state
+        for name, value in zip(GAME_FIELDS, game_values):
+            setattr(self, name, value)
+        self.energy_dice = list(dice)
+        self.dice_assigned = list(assigned)
+        self.dungeon = dungeon
+        
+        adventurer = self.adventurer
+        for name, value in zip(slot_names(type(adventurer)), adventurer_values):
+            setattr(adventurer, name, value)
+            
+        monsters = []
+        names = Monster.__slots__
+        for values in monster_values:
+            monster = Monster.__new__(Monster)
+            for name, value in zip(names, values):
+                setattr(monster, name, value)
+            monsters.append(monster)
+        self.monsters = monsters
+        
+        if rng_state is not None:
+            self.rng.setstate(rng_state)
+        # The log only grows, so cutting it is enough to undo what came after
+        del self.actions[action_count:]
+        self.rebuild_occupancy()
+        
+    def roll_energy_dice(self):
+        randint = self.rng.randint
+        self.energy_dice = [randint(1, 6) for _ in range(3)]
+        self.actions.append(("roll",) + tuple(self.energy_dice))
+        self.dice_rolled = True
+        self.dice_assigned = [False, False, False]
+        self.message = "Assign dice to your skills."
+        
+    def assign_dice(self, dice_index, skill):
+        try:
+            if dice_index < 0 or dice_index >= len(self.dice_assigned):
+                raise IndexError(f"Indice dado non valido: {dice_index}")
+                
+            if self.dice_assigned[dice_index]:
+                return False
+                
+            value = self.energy_dice[dice_index]
+            if skill == "speed":
+                self.total_speed = self.adventurer.speed + value
+                self.remaining_speed = self.total_speed
+            elif skill == "attack":
+                self.total_attack = self.adventurer.attack + value
+                self.remaining_attack = self.total_attack
+            elif skill == "defense":
+                self.total_defense = self.adventurer.defense + value
+                
+            self.dice_assigned[dice_index] = True
+            self.actions.append(("assign", dice_index, skill))
+            
+            # Check if all dice assigned
+            if all(self.dice_assigned):
+                self.game_state = "adventurer"
+                self.message = "Your turn. Move and attack monsters."
+                
+            return True
+        except Exception as e:
+            report_error("assign_dice", e)
+            return False
+        
+    def attack_monster(self, monster_index):
+        try:
+            if monster_index < 0 or monster_index >= len(self.monsters):
+                raise IndexError(f"Indice mostro non valido: {monster_index}")
+                
+            monster = self.monsters[monster_index]
+            
+            # Check range
+            range_to_monster = calculate_range(self.adventurer.x, self.adventurer.y, monster.x, monster.y)
+            if range_to_monster > self.adventurer.range:
+                self.message = f"Monster out of range. Your range is {self.adventurer.range}."
+                return False
+                
+            # Check line of sight
+            if not has_line_of_sight(self.adventurer.x, self.adventurer.y, monster.x, monster.y, self.dungeon, self.monsters):
+                self.message = "No line of sight to monster."
+                return False
+                
+            # Check attack points
+            attack_cost = monster.defense
+            if self.remaining_attack < attack_cost:
+                self.message = f"Not enough attack points. Need {attack_cost}, have {self.remaining_attack}."
+                return False
+                
+            # Attack monster
+            self.actions.append(("attack", monster_index))
+            monster.health -= 1
+            self.remaining_attack -= attack_cost
+            
+            if monster.health <= 0:
+                self.monsters.pop(monster_index)
+                self.occupancy.remove(monster)
+                self.message = f"Monster killed! {len(self.monsters)} remaining."
+                
+                # Check for level complete
+                if not self.monsters:
+                    self.game_state = "level_complete"
+                    self.message = "Level complete! Choose to upgrade a skill or heal."
+            else:
+                self.message = f"Monster hit! {monster.health}/{monster.max_health} health remaining."
+                
+            return True
+        except Exception as e:
+            report_error("attack_monster", e)
+            return False
+        
+    def move_adventurer(self, dx, dy):
+        # Move the adventurer by one tile and check if the stairs were reached
+        try:
+            moved, self.remaining_speed = self.adventurer.move(dx, dy, self.dungeon, self.monsters, self.remaining_speed, self.occupancy)
+        except Exception as e:
+            report_error("move_adventurer", e)
+            return False
+        if moved:
+            self.actions.append(("move", dx, dy))
+        
+        if moved and self.dungeon.tiles[self.adventurer.y * self.dungeon.width + self.adventurer.x] == STAIRS_CODE:
+            self.game_state = "level_complete"
+            self.message = "Level complete! Choose to upgrade a skill or heal."
+            
+        return moved
+        
+    def end_adventurer_turn(self):
+        try:
+            if not all(self.dice_assigned):
+                self.message = "Assign all energy dice first."
+                return False
+                
+            self.actions.append(("end",))
+            self.dice_rolled = False  # the next turn rolls again
+            self.game_state = "monster_move"
+            self.process_monster_move()
+            return True
+        except Exception as e:
+            report_error("end_adventurer_turn", e)
+            return False
+        
+    def process_monster_move(self):
+        try:
+            # Sort monsters by distance to adventurer
+            width = self.dungeon.width
+            from_adv = self.dungeon.ranges_from(self.adventurer.x, self.adventurer.y)
+            self.monsters.sort(key=lambda m: from_adv[m.y * width + m.x])
+            
+            # Move each monster: one that fails stays where it is and the
+            # others still move
+            for monster in self.monsters:
+                try:
+                    monster.move(self.adventurer.x, self.adventurer.y, self.dungeon, self.adventurer, self.monsters,
+                                 self.occupancy, self.candidates)
+                except Exception as e:
+                    report_error("Monster.move", e)
+                
+            self.game_state = "monster_attack"
+            self.process_monster_attack()
+        except Exception as e:
+            report_error("process_monster_move", e)
+            self.game_state = "energy"  # Ripristina lo stato del gioco per evitare blocchi
+            
+    def process_monster_attack(self):
+        try:
+            total_monster_attack = 0
+            attacking_monsters = []
+            
+            # Calculate total attack
+            adv_x, adv_y = self.adventurer.x, self.adventurer.y
+            for monster in self.monsters:
+                if monster.can_attack(adv_x, adv_y, self.monsters, self.dungeon):
+                    total_monster_attack += monster.attack
+                    attacking_monsters.append(monster)
+                    
+            # Calculate damage
+            damage = 0
+            if total_monster_attack > 0 and self.total_defense > 0:
+                damage = total_monster_attack // self.total_defense
+                
+            # Apply damage
+            self.adventurer.health -= damage
+            
+            # Update message
+            if attacking_monsters:
+                self.message = f"{len(attacking_monsters)} monsters attacked for {damage} damage."
+            else:
+                self.message = "No monsters could attack this turn."
+                
+            # Check for game over
+            if self.adventurer.health <= 0:
+                self.adventurer.health = 0
+                self.game_state = "game_over"
+                self.message = "Game Over! You died in the dungeon."
+            else:
+                # Start new turn
+                self.game_state = "energy"
+                self.last_message = self.message
+                self.message = "Roll energy dice for the next turn."
+        except Exception as e:
+            report_error("process_monster_attack", e)
+            self.game_state = "energy"  # Ripristina lo stato del gioco per evitare blocchi
+            
+    def advance_level(self, choice):
+        try:
+            self.actions.append(("advance", choice))
+            if choice == "heal":
+                self.adventurer.heal_full()
+            elif choice in ["speed", "attack", "defense", "range"]:
+                self.adventurer.upgrade_skill(choice)
+                
+            # Go to next level
+            self.level += 1
+            self.dice_rolled = False
+            
+            if self.level > 12:
+                self.game_state = "victory"
+                self.message = "Congratulations! You've completed all 12 levels and found the Sceptre of M'Guf-yn!"
+            else:
+                self.dungeon = self.new_dungeon()
+                self.adventurer.x = 1
+                self.adventurer.y = 1
+                self.spawn_monsters()
+                self.game_state = "energy"
+                self.adventurer.class_ability_used = False
+                self.message = f"Level {self.level} - Roll energy dice to begin."
+        except Exception as e:
+            report_error("advance_level", e)
+            # Resetta lo stato del gioco in caso di errore, on one of the
+            # fixed patterns: calling new_dungeon again could fail the same way
+            self.dungeon = DungeonLevel(self.level, self.width, self.height)
+            self.adventurer.x = 1
+            self.adventurer.y = 1
+            self.spawn_monsters()
+            self.game_state = "energy"
+            
+    def choose_class(self, class_name):
+        self.actions.append(("class", class_name))
+        self.adventurer.class_name = class_name
+        self.adventurer.class_ability_used = False
+        
+    def use_class_ability(self, energy_dice=None):
+        try:
+            if not self.adventurer.class_name or self.adventurer.class_ability_used:
+                return False
+                
+            ability_used = True
+            # Logged before a Barbarian or Wizard reroll adds its own entry
+            self.actions.append(("ability", energy_dice))
+            
+            if self.adventurer.class_name == "Paladin":
+                # Implemented elsewhere when rolling dice
+                pass
+            elif self.adventurer.class_name == "Barbarian":
+                if self.adventurer.health == 1:
+                    self.roll_energy_dice()
+                    self.message = "Rerolled all dice with Barbarian ability."
+                else:
+                    ability_used = False
+                    self.message = "Barbarian ability can only be used at 1 health."
+            elif self.adventurer.class_name == "Ranger":
+                if energy_dice is not None and 0 <= energy_dice < len(self.energy_dice):  # Controllo range
+                    value = self.energy_dice[energy_dice]
+                    self.adventurer.range += value
+                    self.dice_assigned[energy_dice] = True
+                    self.message = f"Assigned {value} to Range with Ranger ability."
+                    
+                    # Check if all dice assigned
+                    if all(self.dice_assigned):
+                        self.game_state = "adventurer"
+                        self.message = "Your turn. Move and attack monsters."
+                else:
+                    ability_used = False
+            elif self.adventurer.class_name == "Wizard":
+                self.roll_energy_dice()
+                self.message = "Rerolled all dice with Wizard ability."
+                
+            if ability_used:
+                self.adventurer.class_ability_used = True
+            else:
+                self.actions.pop()
+                
+            return ability_used
+        except Exception as e:
+            report_error("use_class_ability", e)
+            return False
+
+# Helper functions
+def range_between(x1, y1, x2, y2):
+    # Range between two points in movement cost, ignoring walls
+    dx, dy = abs(x2 - x1), abs(y2 - y1)
+    diag = min(dx, dy)
+    orth = max(dx, dy) - diag
+    return diag * 3 + orth * 2  # 3 for each diagonal, 2 for each orthogonal
+
+# Range between every pair of tiles, one matrix per grid size
+_range_matrices = {}
+
+def get_range_matrix(width, height=None):
+    # matrix[a][b] is the range from tile a to tile b (index y * width + x)
+    if height is None:
+        height = width
+    matrix = _range_matrices.get((width, height))
+    if matrix is None:
+        tiles = [(i % width, i // width) for i in range(width * height)]
+        matrix = [tuple(range_between(x1, y1, x2, y2) for x2, y2 in tiles) for x1, y1 in tiles]
+        _range_matrices[(width, height)] = matrix
+    return matrix
+
+RANGE_MATRIX = get_range_matrix(GRID_SIZE)
+
+class RangeRow:
+    # Row of a range matrix worked out per tile, for boards too big to keep one
+    __slots__ = ("x", "y", "width")
+    
+    def __init__(self, x, y, width):
+        self.x = x
+        self.y = y
+        self.width = width
+        
+    def __getitem__(self, index):
+        return range_between(self.x, self.y, index % self.width, index // self.width)
+
+def calculate_range(x1, y1, x2, y2):
+    # Calculates the range between two points (in movement cost)
+    if 0 <= x1 < GRID_SIZE and 0 <= y1 < GRID_SIZE and 0 <= x2 < GRID_SIZE and 0 <= y2 < GRID_SIZE:
+        return RANGE_MATRIX[y1 * GRID_SIZE + x1][y2 * GRID_SIZE + x2]
+    return range_between(x1, y1, x2, y2)
+
+def range_from(x, y):
+    # Ranges from (x, y) to every tile of a GRID_SIZE board, indexed by
+    # y * GRID_SIZE + x (DungeonLevel.ranges_from works for any size)
+    return RANGE_MATRIX[y * GRID_SIZE + x]
+
+def has_line_of_sight(x1, y1, x2, y2, dungeon, monsters):
+    # Line of sight comes from the visibility table of the layout.
+    # check_line never stops on monsters (its endpoint test compares the
+    # current tile with itself), so walls alone decide the result.
+    width, height = dungeon.width, dungeon.height
+    if 0 <= x1 < width and 0 <= y1 < height and 0 <= x2 < width and 0 <= y2 < height:
+        return dungeon.visibility.is_visible(x1, y1, x2, y2)
+    return False  # Nothing outside the grid can be seen
+
+def trace_line_of_sight(x1, y1, x2, y2, dungeon, monsters):
+    # Original corner-to-corner check: up to 16 check_line traces
+    corners1 = [(x1, y1), (x1+1, y1), (x1, y1+1), (x1+1, y1+1)]
+    corners2 = [(x2, y2), (x2+1, y2), (x2, y2+1), (x2+1, y2+1)]
+    
+    for cx1, cy1 in corners1:
+        for cx2, cy2 in corners2:
+            if check_line(cx1, cy1, cx2, cy2, dungeon, monsters):
+                return True
+                
+    return False
+
+def check_line(x1, y1, x2, y2, dungeon, monsters):
+    # Check if a line between two points crosses any walls or monsters
+    width, height = dungeon.width, dungeon.height
+    tiles = dungeon.tiles
+    
+    # Bresenham's line algorithm
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx - dy
+    
+    while True:
+        # Check if current point is in a wall
+        tile_x, tile_y = int(x1), int(y1)
+        if 0 <= tile_x < width and 0 <= tile_y < height:
+            if tiles[tile_y * width + tile_x] == WALL_CODE:
+                return False
+                
+            # Check for monsters (except at endpoints)
+            if (tile_x, tile_y) != (int(x2), int(y2)) and (tile_x, tile_y) != (int(x1), int(y1)):
+                for monster in monsters:
+                    if monster.x == tile_x and monster.y == tile_y:
+                        return False
+        
+        if x1 == x2 and y1 == y2:
+            break
+            
+        e2 = 2 * err
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+        if e2 < dx:
+            err += dx
+            y1 += sy
+            
+    return True
+
+def line_tiles(x1, y1, x2, y2, width=GRID_SIZE, height=GRID_SIZE):
+    # Tiles inside the grid visited by the same Bresenham walk as check_line
+    tiles = []
+    dx = abs(x2 - x1)
+    dy = abs(y2 - y1)
+    sx = 1 if x1 < x2 else -1
+    sy = 1 if y1 < y2 else -1
+    err = dx - dy
+    
+    while True:
+        if 0 <= x1 < width and 0 <= y1 < height:
+            tiles.append((x1, y1))
+            
+        if x1 == x2 and y1 == y2:
+            break
+            
+        e2 = 2 * err
+        if e2 > -dy:
+            err -= dy
+            x1 += sx
+        if e2 < dx:
+            err += dx
+            y1 += sy
+            
+    return tiles
+
+# Layouts whose tables (visibility, index, distance fields) are kept. The
+# four fixed patterns always fit; with a pool of generated layouts the
+# least recently used ones are dropped and built again if they come back.
+LAYOUT_CACHE_SIZE = 16
+
+class LayoutCache:
+    """Per-layout tables, least recently used layout out first.
+
+    Thread-safe: a LayoutPool filling on its own thread validates layouts
+    (get_layout_index) while the game builds its levels.
+    """
+    def __init__(self, max_size=LAYOUT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        
+    def get(self, key, build):
+        # Entry for key, made by build() if it isn't cached
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                return entry
+        # Built outside the lock, so a slow table doesn't hold up the other
+        # thread. If both build the same entry the first one stored is kept.
+        entry = build()
+        with self.lock:
+            entry = self.entries.setdefault(key, entry)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return entry
+        
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        
+    def __len__(self):
+        return len(self.entries)
+
+# Visibility tables shared by every DungeonLevel with the same layout
+_visibility_tables = LayoutCache()
+
+def get_visibility_table(dungeon):
+    if dungeon.width * dungeon.height <= SMALL_BOARD_TILES:
+        return _visibility_tables.get(dungeon.layout_key, lambda: VisibilityTable(dungeon))
+    return _visibility_tables.get(dungeon.layout_key, lambda: LazyVisibility(dungeon))
+
+class VisibilityTable:
+    """Wall-only line of sight between every pair of tiles of a layout.
+
+    visible[a] is a bitmask of the tiles that can be seen from tile a
+    (tile index = y * width + x), seen_by[b] the same the other way round.
+    """
+    def __init__(self, dungeon):
+        width, height = dungeon.width, dungeon.height
+        tile_count = width * height
+        walls = dungeon.wall_mask
+        self.width = width
+                    
+        # Tiles crossed by each corner-to-corner line, computed once
+        lines = {}
+        def line_mask(cx1, cy1, cx2, cy2):
+            key = (cx1, cy1, cx2, cy2)
+            mask = lines.get(key)
+            if mask is None:
+                mask = 0
+                for tx, ty in line_tiles(cx1, cy1, cx2, cy2, width, height):
+                    mask |= 1 << (ty * width + tx)
+                lines[key] = mask
+            return mask
+            
+        def clear_line(corners1, corners2):
+            for cx1, cy1 in corners1:
+                for cx2, cy2 in corners2:
+                    if not line_mask(cx1, cy1, cx2, cy2) & walls:
+                        return True
+            return False
+            
+        self.visible = [0] * tile_count
+        for a in range(tile_count):
+            x1, y1 = a % width, a // width
+            corners1 = [(x1, y1), (x1+1, y1), (x1, y1+1), (x1+1, y1+1)]
+            for b in range(tile_count):
+                x2, y2 = b % width, b // width
+                corners2 = [(x2, y2), (x2+1, y2), (x2, y2+1), (x2+1, y2+1)]
+                if clear_line(corners1, corners2):
+                    self.visible[a] |= 1 << b
+                    
+        # seen_by[b]: tiles that can see tile b (line of sight isn't symmetric)
+        self.seen_by = [0] * tile_count
+        for a in range(tile_count):
+            for b in iter_bits(self.visible[a]):
+                self.seen_by[b] |= 1 << a
+                    
+    def is_visible(self, x1, y1, x2, y2):
+        width = self.width
+        return (self.visible[y1 * width + x1] >> (y2 * width + x2)) & 1 == 1
+        
+    def visible_within(self, index, mask):
+        # Tiles of mask that tile index can see
+        return self.visible[index] & mask
+        
+    def seen_within(self, index, mask):
+        # Tiles of mask that can see tile index
+        return self.seen_by[index] & mask
+
+# Pairs a LazyVisibility remembers before starting over
+LAZY_VISIBILITY_CACHE = 1 << 18
+
+class LazyVisibility:
+    """Wall-only line of sight for boards too big for a VisibilityTable.
+
+    Same queries, answered with the corner traces of trace_line_of_sight
+    the first time a pair is asked for. Only the tiles of the mask passed
+    to visible_within/seen_within are traced, so callers narrow the mask
+    down (by range) first.
+    """
+    def __init__(self, dungeon):
+        self.dungeon = dungeon.copy()
+        self.width = dungeon.width
+        self.pairs = {}
+        
+    def is_visible(self, x1, y1, x2, y2):
+        width = self.width
+        key = (y1 * width + x1, y2 * width + x2)
+        seen = self.pairs.get(key)
+        if seen is None:
+            if len(self.pairs) >= LAZY_VISIBILITY_CACHE:
+                self.pairs.clear()
+            seen = self.pairs[key] = trace_line_of_sight(x1, y1, x2, y2, self.dungeon, ())
+        return seen
+        
+    def visible_within(self, index, mask):
+        width = self.width
+        x, y = index % width, index // width
+        result = 0
+        for b in iter_bits(mask):
+            if self.is_visible(x, y, b % width, b // width):
+                result |= 1 << b
+        return result
+        
+    def seen_within(self, index, mask):
+        width = self.width
+        x, y = index % width, index // width
+        result = 0
+        for a in iter_bits(mask):
+            if self.is_visible(a % width, a // width, x, y):
+                result |= 1 << a
+        return result
+
+# Layout indexes shared by every DungeonLevel with the same layout
+_layout_indexes = LayoutCache()
+
+def get_layout_index(tiles, width, height):
+    # Keyed like DungeonLevel.layout_key, so raw tiles (see layouts.py) and
+    # levels built from them share one index
+    return _layout_indexes.get((width, bytes(tiles)), lambda: LayoutIndex(tiles, width, height))
+
+class LayoutIndex:
+    """Which tiles of a layout can be walked to from where.
+
+    component[i] numbers the group of non-wall tiles that tile i can walk
+    to and from (-1 for walls); components[c] is the bitmask of group c.
+    reachable is the mask of the tiles reachable from the start at (1, 1),
+    floor_tiles the floor tiles among them and spawn_tiles the ones outside
+    the 3x3 around the start, all in row order as (x, y). Built once per
+    layout, so spawning and validating a level don't scan the grid.
+    """
+    def __init__(self, tiles, width, height):
+        board = get_board(width, height)
+        walls = int(bytes(tiles).translate(_WALL_BITS)[::-1], 2)
+        left = board.full & ~walls
+        self.width = width
+        self.component = array("i", [-1]) * (width * height)
+        self.components = []
+        while left:
+            # Everything reachable from the lowest tile not labelled yet
+            group = board.reachable(left & -left, left, None)
+            for i in iter_bits(group):
+                self.component[i] = len(self.components)
+            self.components.append(group)
+            left &= ~group
+            
+        start = width + 1
+        self.start_component = self.component[start]
+        self.reachable = self.components[self.start_component] if self.start_component >= 0 else 0
+        stairs = bytes(tiles).find(STAIRS_CODE)
+        self.stairs = (stairs % width, stairs // width) if stairs >= 0 else None
+        self.stairs_reachable = stairs >= 0 and (self.reachable >> stairs) & 1 == 1
+        self.floor_tiles = tuple((i % width, i // width) for i in iter_bits(self.reachable)
+                                 if tiles[i] == FLOOR_CODE)
+        self.spawn_tiles = tuple((x, y) for x, y in self.floor_tiles if x > 2 or y > 2)
+        
+    def connected(self, x1, y1, x2, y2):
+        # Can (x2, y2) be walked to from (x1, y1), ignoring the entities
+        group = self.component[y1 * self.width + x1]
+        return group >= 0 and group == self.component[y2 * self.width + x2]
+        
+    def is_reachable(self, x, y):
+        # From the start
+        return (self.reachable >> (y * self.width + x)) & 1 == 1
+
+# Distance fields shared by every DungeonLevel with the same layout
+_distance_fields = LayoutCache()
+
+def compute_distance_field(dungeon, target_x, target_y, blocked=(), until=None):
+    # Cheapest path cost from every tile to the target, honoring 2/3 costs,
+    # grown one cost layer at a time on bitboards. Tiles in blocked (e.g.
+    # occupied ones) are avoided too. With until=(x, y) the growing stops at
+    # that tile: the farther ones stay UNREACHABLE, which is all a walk from
+    # there looks at.
+    # Result is indexed by y * width + x.
+    board = dungeon.board
+    field = [UNREACHABLE] * (dungeon.width * dungeon.height)
+    passable = dungeon.walkable_mask & ~board.mask_of(blocked)
+    stop_at = board.bit(*until) if until else 0
+    for distance, layer in enumerate(board.cost_layers(board.bit(target_x, target_y), passable, until=stop_at)):
+        for index in iter_bits(layer):
+            field[index] = distance
+            
+    return field
+
+class SparseField(dict):
+    # Distance field that only holds the tiles a search reached
+    __slots__ = ()
+    
+    def __missing__(self, index):
+        return UNREACHABLE
+
+def bounded_distance_field(dungeon, target_x, target_y, from_x, from_y, speed=0, blocked=()):
+    # Same costs as compute_distance_field, for one walk of up to speed from
+    # (from_x, from_y) down to the target. The search is an A* from the
+    # target towards the walker (range_between never overestimates a path)
+    # that goes on until every tile such a walk can look at is settled:
+    # those tiles are within speed + 3 of the walker, so a tile is needed
+    # only if its cost plus its range to the walker is under the walker's
+    # cost plus speed + 3. The walk then takes the same steps as on the full
+    # field; everything else reads as UNREACHABLE.
+    width, height = dungeon.width, dungeon.height
+    tiles = dungeon.tiles
+    avoid = {y * width + x for x, y in blocked}
+    goal = from_y * width + from_x
+    limit = None
+    field = SparseField()
+    start = target_y * width + target_x
+    queue = [(range_between(target_x, target_y, from_x, from_y), 0, start)]
+    while queue:
+        estimate, distance, index = heappop(queue)
+        if limit is not None and estimate >= limit:
+            break
+        if index in field:
+            continue
+        field[index] = distance
+        if index == goal:
+            limit = distance + speed + 3
+        x, y = index % width, index // width
+        for dx, dy, cost in MOVES:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < width and 0 <= ny < height:
+                neighbour = ny * width + nx
+                if neighbour not in field and tiles[neighbour] != WALL_CODE and neighbour not in avoid:
+                    # range_between(nx, ny, from_x, from_y), inlined
+                    rx, ry = abs(nx - from_x), abs(ny - from_y)
+                    guess = 2 * rx + ry if rx > ry else 2 * ry + rx
+                    heappush(queue, (distance + cost + guess, distance + cost, neighbour))
+    return field
@@ -0,0 +1,188 @@
+"""Procedural dungeon layouts.
+
+generate_layout(width, height, seed) carves rooms joined by corridors out of
+a solid block, with the adventurer start at (1, 1) and the stairs at
+(width - 2, height - 2), and only returns layouts that validate_layout
+accepts: closed border, both ends on the floor, stairs reachable from the
+start. The same seed always gives the same layout.
+
+A LayoutPool holds a fixed number of them, layout i made from the seed
+"<pool seed>-<i>", so a pool is fully described by its size, seed and board
+size. It can fill itself on a background thread and be saved to disk, and a
+Game given a pool picks each level from it with its own random stream:
+
+    pool = load_pool("layouts.json") or LayoutPool(size=64)
+    pool.start("layouts.json")          # fill in the background, then save
+    game = Game(layouts=pool)
+
+Picking is a list lookup once layout i is built. A pick that comes before
+the background thread got there builds that one layout on the spot.
+
+    python layouts.py --size 256 --width 16 --height 16 --save layouts-16.json
+"""
+import argparse
+import json
+import os
+import random
+import threading
+
+from dungeon_core import GRID_SIZE, FLOOR_CODE, STAIRS_CODE, WALL_CODE, get_layout_index
+
+# Tries per layout before giving up on a seed. The rooms are joined as they
+# are carved, so the first try should always pass; the check is the guarantee.
+MAX_ATTEMPTS = 100
+
+def carve(tiles, width, x1, y1, x2, y2):
+    # Floor on every tile of the rectangle between the two corners
+    for y in range(min(y1, y2), max(y1, y2) + 1):
+        row = y * width
+        for x in range(min(x1, x2), max(x1, x2) + 1):
+            tiles[row + x] = FLOOR_CODE
+
+def generate_layout(width=GRID_SIZE, height=GRID_SIZE, seed=0):
+    # Tiles (a bytearray of TileType values, index y * width + x) of a
+    # validated layout made from the seed
+    for attempt in range(MAX_ATTEMPTS):
+        tiles = carve_rooms(width, height, random.Random(f"{seed}-{attempt}"))
+        if validate_layout(tiles, width, height):
+            return tiles
+    raise ValueError(f"no valid {width}x{height} layout for seed {seed!r}")
+
+def carve_rooms(width, height, rng):
+    tiles = bytearray([WALL_CODE]) * (width * height)
+    inner_w, inner_h = width - 2, height - 2
+    # Rooms up to half the board, or 10 tiles across on big boards
+    max_w, max_h = max(2, min(inner_w // 2, 10)), max(2, min(inner_h // 2, 10))
+
+    # Rooms as (x, y, w, h): one at the start, some in between, one at the stairs
+    rooms = [(1, 1, rng.randint(2, max_w), rng.randint(2, max_h))]
+    for _ in range(max(2, inner_w * inner_h // 40)):
+        w, h = rng.randint(2, max_w), rng.randint(2, max_h)
+        rooms.append((rng.randint(1, width - 1 - w), rng.randint(1, height - 1 - h), w, h))
+    w, h = rng.randint(2, max_w), rng.randint(2, max_h)
+    rooms.append((width - 1 - w, height - 1 - h, w, h))
+
+    # Each room joined to the one before by an L-shaped corridor, so all of
+    # them hang together
+    centre = None
+    for x, y, w, h in rooms:
+        carve(tiles, width, x, y, x + w - 1, y + h - 1)
+        cx, cy = rng.randint(x, x + w - 1), rng.randint(y, y + h - 1)
+        if centre is not None:
+            px, py = centre
+            if rng.random() < 0.5:
+                carve(tiles, width, px, py, cx, py)
+                carve(tiles, width, cx, py, cx, cy)
+            else:
+                carve(tiles, width, px, py, px, cy)
+                carve(tiles, width, px, cy, cx, cy)
+        centre = (cx, cy)
+
+    tiles[(height - 2) * width + width - 2] = STAIRS_CODE
+    return tiles
+
+def validate_layout(tiles, width, height):
+    # Closed border, start on the floor, stairs in place and reachable
+    if len(tiles) != width * height:
+        return False
+    for x in range(width):
+        if tiles[x] != WALL_CODE or tiles[(height - 1) * width + x] != WALL_CODE:
+            return False
+    for y in range(height):
+        if tiles[y * width] != WALL_CODE or tiles[y * width + width - 1] != WALL_CODE:
+            return False
+    stairs = (height - 2) * width + width - 2
+    if tiles[width + 1] != FLOOR_CODE or bytes(tiles).count(STAIRS_CODE) != 1 or tiles[stairs] != STAIRS_CODE:
+        return False
+    # The index is kept, so the level built from this layout reuses it
+    return get_layout_index(tiles, width, height).stairs_reachable
+
+class LayoutPool:
+    def __init__(self, width=GRID_SIZE, height=GRID_SIZE, size=64, seed=0):
+        self.width = width
+        self.height = height
+        self.size = size
+        self.seed = seed
+        self.layouts = [None] * size
+        self.thread = None
+
+    def layout(self, index):
+        # Layout i is the same whoever builds it, so the background thread
+        # and a pick racing for it just store equal bytes
+        layout = self.layouts[index]
+        if layout is None:
+            layout = bytes(generate_layout(self.width, self.height, f"{self.seed}-{index}"))
+            self.layouts[index] = layout
+        return layout
+
+    def pick(self, rng):
+        return self.layout(rng.randrange(self.size))
+
+    def ready(self):
+        return sum(layout is not None for layout in self.layouts)
+
+    def fill(self):
+        for index in range(self.size):
+            self.layout(index)
+
+    def start(self, path=None):
+        # Fill on a daemon thread, then save to path if one is given
+        def work():
+            self.fill()
+            if path:
+                self.save(path)
+        self.thread = threading.Thread(target=work, name="layout-pool", daemon=True)
+        self.thread.start()
+        return self.thread
+
+    def describe(self):
+        # Enough to build the same pool again (see replay.py)
+        return {"width": self.width, "height": self.height, "size": self.size, "seed": self.seed}
+
+    def save(self, path):
+        data = self.describe()
+        data["layouts"] = [layout.hex() if layout is not None else None for layout in self.layouts]
+        # Written next to the target and renamed, so a reader never sees half a file
+        with open(path + ".tmp", "w") as f:
+            json.dump(data, f)
+        os.replace(path + ".tmp", path)
+
+def load_pool(path, width=None, height=None):
+    # Pool saved by LayoutPool.save, None if there is no file. Every stored
+    # layout is validated again: a bad one raises ValueError, and so does a
+    # pool made for another board size than width x height (when given).
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        data = json.load(f)
+    if (width is not None and data["width"] != width) or (height is not None and data["height"] != height):
+        raise ValueError(f"{path}: layouts are {data['width']}x{data['height']}, "
+                         f"the board is {width or data['width']}x{height or data['height']}")
+    pool = LayoutPool(data["width"], data["height"], data["size"], data["seed"])
+    for index, layout in enumerate(data["layouts"]):
+        if layout is None:
+            continue
+        layout = bytes.fromhex(layout)
+        if not validate_layout(layout, pool.width, pool.height):
+            raise ValueError(f"{path}: layout {index} is not valid")
+        pool.layouts[index] = layout
+    return pool
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build a pool of procedural layouts and save it")
+    parser.add_argument("--size", type=int, default=64, help="layouts in the pool")
+    parser.add_argument("--width", type=int, default=GRID_SIZE)
+    parser.add_argument("--height", type=int, default=GRID_SIZE)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--save", default="layouts.json")
+    args = parser.parse_args(argv)
+
+    pool = load_pool(args.save)
+    if pool is None or pool.describe() != LayoutPool(args.width, args.height, args.size, args.seed).describe():
+        pool = LayoutPool(args.width, args.height, args.size, args.seed)
+    pool.fill()
+    pool.save(args.save)
+    print(f"{pool.size} {pool.width}x{pool.height} layouts saved to {args.save}")
+
+if __name__ == "__main__":
+    main()
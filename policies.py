@@ -0,0 +1,132 @@
+"""Automatic adventurer strategies for headless games.
+
+A policy plays the adventurer's side of a dungeon_core.Game: it assigns the
+rolled energy dice, moves and attacks during the adventurer turn, and picks
+the reward when a level is complete. Policies are looked up by name in
+POLICIES, which is what the campaign runner exposes on the command line.
+"""
+from ai import ExpectimaxAI, play_turn
+from dungeon_core import (SMALL_BOARD_TILES, MOVES, bounded_distance_field, calculate_range,
+                          compute_distance_field, has_line_of_sight)
+
+def step_down(game, field):
+    # Step to the neighbour with the lowest distance, if it gets us closer
+    adv = game.adventurer
+    width, height = game.dungeon.width, game.dungeon.height
+    here = field[adv.y * width + adv.x]
+    options = []
+    for dx, dy, cost in MOVES:
+        nx, ny = adv.x + dx, adv.y + dy
+        if 0 <= nx < width and 0 <= ny < height and cost <= game.remaining_speed:
+            value = field[ny * width + nx]
+            if value < here:
+                options.append((value, dx, dy))
+    options.sort(key=lambda o: o[0])
+    for value, dx, dy in options:
+        if game.move_adventurer(dx, dy):
+            return True
+    return False
+
+def walk_down(game, field):
+    while game.game_state == "adventurer" and step_down(game, field):
+        pass
+
+def attack_all(game):
+    # Hit the first monster that can be hit until nothing is left to do
+    hit = True
+    while hit and game.game_state == "adventurer":
+        hit = False
+        for i in range(len(game.monsters)):
+            if game.attack_monster(i):
+                hit = True
+                break
+
+class Policy:
+    # Skills receiving the highest, middle and lowest die
+    dice_order = ("speed", "defense", "attack")
+    upgrade = "speed"
+
+    def assign_dice(self, game):
+        order = sorted(range(len(game.energy_dice)), key=lambda i: -game.energy_dice[i])
+        for dice_index, skill in zip(order, self.dice_order):
+            game.assign_dice(dice_index, skill)
+
+    def play_turn(self, game):
+        attack_all(game)
+
+    def choose_upgrade(self, game):
+        if game.adventurer.health <= game.adventurer.max_health // 2:
+            return "heal"
+        return self.upgrade
+
+class StairsPolicy(Policy):
+    """Run for the stairs, hitting whatever is in range at the end of the move.
+
+    Same strategy as the adventurer in batch_sim.
+    """
+    def play_turn(self, game):
+        # Route around the monsters so they can't block the way
+        dungeon = game.dungeon
+        stairs_x, stairs_y = dungeon.width - 2, dungeon.height - 2
+        occupied = {(m.x, m.y) for m in game.monsters}
+        if dungeon.width * dungeon.height <= SMALL_BOARD_TILES:
+            field = compute_distance_field(dungeon, stairs_x, stairs_y, occupied)
+        else:
+            adv = game.adventurer
+            field = bounded_distance_field(dungeon, stairs_x, stairs_y, adv.x, adv.y,
+                                           game.remaining_speed, occupied)
+        walk_down(game, field)
+        attack_all(game)
+
+class HunterPolicy(Policy):
+    """Put the best die in attack and chase the closest monster."""
+    dice_order = ("attack", "speed", "defense")
+    upgrade = "attack"
+
+    def play_turn(self, game):
+        attack_all(game)
+        if game.game_state != "adventurer" or not game.monsters:
+            return
+        adv = game.adventurer
+        target = min(game.monsters, key=lambda m: calculate_range(adv.x, adv.y, m.x, m.y))
+        # Stop as soon as the target can be shot at
+        field = game.dungeon.walk_field(target.x, target.y, adv.x, adv.y, game.remaining_speed)
+        while game.game_state == "adventurer":
+            if calculate_range(adv.x, adv.y, target.x, target.y) <= adv.range and \
+                    has_line_of_sight(adv.x, adv.y, target.x, target.y, game.dungeon, game.monsters):
+                break
+            if not step_down(game, field):
+                break
+        attack_all(game)
+
+class CautiousPolicy(StairsPolicy):
+    """Head for the stairs too, but with the best die in defense."""
+    dice_order = ("defense", "speed", "attack")
+    upgrade = "defense"
+
+class ExpectimaxPolicy(Policy):
+    """Pick dice, moves and attacks with the expectimax search in ai.py."""
+    depth = 2
+
+    def __init__(self):
+        self.ai = ExpectimaxAI(depth=self.depth)
+        self.turn = None
+
+    def assign_dice(self, game):
+        self.turn = self.ai.plan_turn(game)
+        for dice_index, skill in enumerate(self.turn.assignment):
+            game.assign_dice(dice_index, skill)
+
+    def play_turn(self, game):
+        play_turn(game, self.turn)
+        attack_all(game)
+
+POLICIES = {
+    "stairs": StairsPolicy,
+    "hunter": HunterPolicy,
+    "cautious": CautiousPolicy,
+    "expectimax": ExpectimaxPolicy,
+}
+
+def get_policy(name):
+    return POLICIES[name]()
@@ -0,0 +1,236 @@
+"""Opt-in timing of the game rules.
+
+A Profiler wraps the phase methods of a Game class (dice, adventurer turn,
+monster move and attack, level change) and the helpers of dungeon_core
+(line of sight, ranges, distance fields, monster moves) with timers, and
+puts everything back when it is removed. Nothing is wrapped unless a
+profiler is installed, so normal play pays nothing for it.
+
+    profiler = Profiler(trace=True)
+    with profiler.installed():
+        play_game(policy)
+    profiler.save_json("profile.json")
+    profiler.save_chrome_trace("trace.json")   # chrome://tracing or Perfetto
+
+Every timed call has a total time and a self time (total minus the timed
+calls made inside it), so the phases add up even though process_monster_move
+ends by calling process_monster_attack.
+
+From the command line it profiles campaign games:
+
+    python profiling.py --policy stairs --games 200 --json profile.json --trace trace.json
+"""
+import argparse
+import json
+import sys
+from contextlib import contextmanager
+from time import perf_counter
+
+import dungeon_core
+from dungeon_core import Game, Monster
+
+# Game method -> phase of the state machine
+GAME_PHASES = {
+    "roll_energy_dice": "energy",
+    "assign_dice": "energy",
+    "use_class_ability": "energy",
+    "move_adventurer": "adventurer",
+    "attack_monster": "adventurer",
+    "end_adventurer_turn": "adventurer",
+    "process_monster_move": "monster_move",
+    "process_monster_attack": "monster_attack",
+    "advance_level": "level",
+    "spawn_monsters": "level",
+}
+
+MONSTER_METHODS = ("move", "find_best_position", "can_attack")
+
+HELPERS = ("has_line_of_sight", "calculate_range", "compute_distance_field", "get_visibility_table")
+
+class CallStats:
+    __slots__ = ("category", "calls", "total", "self_time", "max_time")
+
+    def __init__(self, category):
+        self.category = category
+        self.calls = 0
+        self.total = 0.0
+        self.self_time = 0.0
+        self.max_time = 0.0
+
+class Profiler:
+    def __init__(self, trace=False, max_events=1000000):
+        self.trace = trace
+        self.max_events = max_events
+        self.stats = {}
+        self.events = []
+        self.dropped_events = 0
+        self._children = []  # time spent in timed calls, one entry per open call
+        self._patches = []
+        self._start = perf_counter()
+
+    def reset(self):
+        # Cleared in place: the installed wrappers hold on to these
+        self.stats.clear()
+        self.events.clear()
+        self.dropped_events = 0
+        self._start = perf_counter()
+
+    def timed(self, name, category, func):
+        # func with the same arguments, timed under name
+        stats = self.stats
+        children = self._children
+
+        def wrapper(*args, **kwargs):
+            children.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                inner = children.pop()
+                if children:
+                    children[-1] += elapsed
+                entry = stats.get(name)
+                if entry is None:
+                    entry = stats[name] = CallStats(category)
+                entry.calls += 1
+                entry.total += elapsed
+                entry.self_time += elapsed - inner
+                if elapsed > entry.max_time:
+                    entry.max_time = elapsed
+                if self.trace:
+                    self.add_event(name, category, start, elapsed)
+        wrapper.__wrapped__ = func
+        return wrapper
+
+    def add_event(self, name, category, start, elapsed):
+        if len(self.events) >= self.max_events:
+            self.dropped_events += 1
+            return
+        self.events.append((name, category, start, elapsed))
+
+    def _patch(self, owner, attribute, value):
+        self._patches.append((owner, attribute, owner.__dict__.get(attribute, _MISSING)))
+        setattr(owner, attribute, value)
+
+    def install(self, game_class=Game):
+        # Subclasses (the tutorial Game) are wrapped with their own overrides
+        if self._patches:
+            raise RuntimeError("profiler already installed")
+        for method, phase in GAME_PHASES.items():
+            func = getattr(game_class, method)
+            self._patch(game_class, method, self.timed(f"Game.{method}", phase, func))
+        for method in MONSTER_METHODS:
+            func = getattr(Monster, method)
+            self._patch(Monster, method, self.timed(f"Monster.{method}", "monster", func))
+        # Helpers are also replaced in the modules that imported them by name
+        for name in HELPERS:
+            func = getattr(dungeon_core, name)
+            wrapper = self.timed(name, "helper", func)
+            for module in list(sys.modules.values()):
+                if getattr(module, "__dict__", {}).get(name) is func:
+                    self._patch(module, name, wrapper)
+
+    def uninstall(self):
+        while self._patches:
+            owner, attribute, original = self._patches.pop()
+            if original is _MISSING:
+                delattr(owner, attribute)
+            else:
+                setattr(owner, attribute, original)
+
+    @contextmanager
+    def installed(self, game_class=Game):
+        self.install(game_class)
+        try:
+            yield self
+        finally:
+            self.uninstall()
+
+    def phases(self):
+        # Self time per category: the state machine phases plus "monster" and "helper"
+        phases = {}
+        for entry in self.stats.values():
+            phase = phases.setdefault(entry.category, {"calls": 0, "self_ms": 0.0})
+            phase["calls"] += entry.calls
+            phase["self_ms"] += entry.self_time * 1000
+        return phases
+
+    def to_dict(self):
+        return {
+            "wall_ms": (perf_counter() - self._start) * 1000,
+            "phases": self.phases(),
+            "calls": {
+                name: {
+                    "category": entry.category,
+                    "calls": entry.calls,
+                    "total_ms": entry.total * 1000,
+                    "self_ms": entry.self_time * 1000,
+                    "mean_us": entry.total * 1e6 / entry.calls,
+                    "max_us": entry.max_time * 1e6,
+                }
+                for name, entry in sorted(self.stats.items(), key=lambda item: -item[1].self_time)
+            },
+        }
+
+    def save_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def chrome_trace(self):
+        # Trace Event Format, complete ("X") events in microseconds
+        events = [
+            {"name": name, "cat": category, "ph": "X", "pid": 0, "tid": 0,
+             "ts": (start - self._start) * 1e6, "dur": elapsed * 1e6}
+            for name, category, start, elapsed in self.events
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms",
+                "otherData": {"dropped_events": self.dropped_events}}
+
+    def save_chrome_trace(self, path):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        data = self.to_dict()
+        lines = [f"Wall time: {data['wall_ms']:.1f} ms", "Phase              calls    self ms"]
+        for phase, values in sorted(data["phases"].items(), key=lambda item: -item[1]["self_ms"]):
+            lines.append(f"{phase:<16} {values['calls']:8d} {values['self_ms']:10.1f}")
+        lines.append("Call                                calls   total ms    self ms    mean us")
+        for name, values in data["calls"].items():
+            lines.append(f"{name:<34} {values['calls']:8d} {values['total_ms']:10.1f} "
+                         f"{values['self_ms']:10.1f} {values['mean_us']:10.2f}")
+        return "\n".join(lines)
+
+_MISSING = object()
+
+def main(argv=None):
+    from campaign import game_seed, play_game
+    from policies import POLICIES, get_policy
+
+    parser = argparse.ArgumentParser(description="Profile the game rules while playing campaign games.")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="stairs")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-turns", type=int, default=1000)
+    parser.add_argument("--json", help="write the timings to this JSON file")
+    parser.add_argument("--trace", help="write a Chrome trace-event file (one event per call)")
+    args = parser.parse_args(argv)
+
+    dungeon_core.set_error_mode("strict")
+    policy = get_policy(args.policy)
+    profiler = Profiler(trace=bool(args.trace))
+    with profiler.installed():
+        for game_index in range(args.games):
+            play_game(policy, args.max_turns, game_seed(args.seed, game_index))
+
+    print(profiler.summary())
+    if args.json:
+        profiler.save_json(args.json)
+    if args.trace:
+        profiler.save_chrome_trace(args.trace)
+        if profiler.dropped_events:
+            print(f"Trace full: {profiler.dropped_events} events not recorded")
+
+if __name__ == "__main__":
+    main()
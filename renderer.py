@@ -0,0 +1,376 @@
+"""Dirty-region renderer shared by the pygame front ends.
+
+The screen is split into fixed sections (title, player stats, monster
+stats, grid tiles, dice, buttons, messages). Every frame each section
+computes a small key from the game state; only the sections whose key
+changed are repainted, and only their rectangles are pushed to the display
+with pygame.display.update(rects). When nothing changed the frame costs a
+handful of tuple comparisons and no blits at all.
+
+The walls, floor, stairs and grid lines of a dungeon never change, so they
+are rendered once per layout to an off-screen surface and blitted back one
+tile at a time when something moves off a tile.
+"""
+import pygame
+
+from dungeon_core import GRID_SIZE, LayoutCache, TileType
+from text_cache import render_text
+
+# Constants
+SCREEN_WIDTH = 1000
+SCREEN_HEIGHT = 800
+TILE_SIZE = 65
+BUTTON_HEIGHT = 50
+INFO_HEIGHT = 80
+
+# Colors
+WHITE = (255, 255, 255)
+BLACK = (0, 0, 0)
+GRAY = (150, 150, 150)
+RED = (255, 0, 0)
+GREEN = (0, 255, 0)
+BLUE = (0, 0, 255)
+YELLOW = (255, 205, 0)
+BROWN = (165, 42, 42)
+LIGHT_BROWN = (210, 180, 140)
+DARK_GREEN = (0, 100, 0)
+PURPLE = (128, 0, 128)
+
+GRID_OFFSET_X = (SCREEN_WIDTH - GRID_SIZE * TILE_SIZE) // 2
+GRID_OFFSET_Y = 100
+GRID_RIGHT = GRID_OFFSET_X + GRID_SIZE * TILE_SIZE
+
+DICE_WIDTH = 50
+DICE_SPACING = 20
+BUTTON_Y = SCREEN_HEIGHT - INFO_HEIGHT - BUTTON_HEIGHT
+DICE_Y = BUTTON_Y - DICE_WIDTH - 10
+
+# Screen sections, each one is cleared and redrawn as a whole
+HEADER_RECT = pygame.Rect(0, 0, GRID_RIGHT, 88)
+STATS_RECT = pygame.Rect(0, 88, GRID_OFFSET_X - 1, DICE_Y - 98)
+MONSTERS_RECT = pygame.Rect(GRID_RIGHT + 1, 60, SCREEN_WIDTH - GRID_RIGHT - 1, DICE_Y - 70)
+DICE_RECT = pygame.Rect(0, DICE_Y - 10, SCREEN_WIDTH, DICE_WIDTH + 20)
+BUTTONS_RECT = pygame.Rect(0, BUTTON_Y, SCREEN_WIDTH, BUTTON_HEIGHT)
+MESSAGE_RECT = pygame.Rect(0, SCREEN_HEIGHT - INFO_HEIGHT, SCREEN_WIDTH, INFO_HEIGHT)
+
+# Static dungeon layers of the layouts drawn last: the four fixed patterns
+# fit, a pool of generated layouts doesn't keep one surface per layout
+STATIC_LAYER_CACHE = 4
+_static_layers = LayoutCache(STATIC_LAYER_CACHE)
+
+def get_static_layer(dungeon, font):
+    return _static_layers.get(dungeon.layout_key, lambda: draw_static_layer(dungeon, font))
+
+def draw_static_layer(dungeon, font):
+    # Tiles and grid lines of the layout, which never change during a level
+    layer = pygame.Surface((GRID_SIZE * TILE_SIZE, GRID_SIZE * TILE_SIZE))
+    for y in range(GRID_SIZE):
+        for x in range(GRID_SIZE):
+            tile_x = x * TILE_SIZE
+            tile_y = y * TILE_SIZE
+
+            # Draw tile
+            if dungeon.grid[y][x] == TileType.WALL:
+                pygame.draw.rect(layer, BROWN, (tile_x, tile_y, TILE_SIZE, TILE_SIZE))
+            elif dungeon.grid[y][x] == TileType.STAIRS:
+                pygame.draw.rect(layer, LIGHT_BROWN, (tile_x, tile_y, TILE_SIZE, TILE_SIZE))
+                stair_text = render_text(font, "↓", True, BLACK)
+                layer.blit(stair_text, (tile_x + TILE_SIZE//2 - 10, tile_y + TILE_SIZE//2 - 10))
+            else:
+                pygame.draw.rect(layer, LIGHT_BROWN, (tile_x, tile_y, TILE_SIZE, TILE_SIZE))
+
+            # Draw grid lines
+            pygame.draw.rect(layer, BLACK, (tile_x, tile_y, TILE_SIZE, TILE_SIZE), 1)
+    return layer
+
+def tile_rect(x, y):
+    return pygame.Rect(GRID_OFFSET_X + x * TILE_SIZE, GRID_OFFSET_Y + y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+class Renderer:
+    def __init__(self, screen, font, small_font, title_font):
+        self.screen = screen
+        self.font = font
+        self.small_font = small_font
+        self.title_font = title_font
+        self.sections = [
+            (HEADER_RECT, self.header_key, self.draw_header),
+            (STATS_RECT, self.stats_key, self.draw_stats),
+            (MONSTERS_RECT, self.monsters_key, self.draw_monsters),
+            (DICE_RECT, self.dice_key, self.draw_dice),
+            (BUTTONS_RECT, self.buttons_key, self.draw_buttons),
+            (MESSAGE_RECT, self.message_key, self.draw_message),
+        ]
+        self.invalidate()
+
+    def invalidate(self):
+        # Forget everything on screen, the next draw repaints the whole window
+        self.keys = [None] * len(self.sections)
+        self.tiles = {}
+        self.layout_key = None
+        self.overlay = None
+        self.full_redraw = True
+
+    def overlay_key(self):
+        # Subclasses drawing on top of the game return a key for it here
+        return None
+
+    def draw_overlay(self):
+        pass
+
+    def draw(self, game, selected_dice=None):
+        overlay = self.overlay_key()
+        if overlay != self.overlay:
+            self.invalidate()
+            self.overlay = overlay
+        if self.full_redraw:
+            self.screen.fill(WHITE)
+
+        dirty = []
+        for i, (rect, key_func, draw_func) in enumerate(self.sections):
+            key = key_func(game, selected_dice)
+            if key != self.keys[i]:
+                self.keys[i] = key
+                self.screen.set_clip(rect)
+                self.screen.fill(WHITE, rect)
+                draw_func(game, selected_dice)
+                self.screen.set_clip(None)
+                dirty.append(rect)
+        dirty.extend(self.draw_grid(game))
+
+        if self.full_redraw:
+            self.draw_overlay()
+            pygame.display.flip()
+            self.full_redraw = False
+        elif dirty:
+            if overlay is not None:
+                # Something changed under the overlay, paint it again on top
+                self.draw_overlay()
+                pygame.display.flip()
+            else:
+                pygame.display.update(dirty)
+        return dirty
+
+    def draw_grid(self, game):
+        # Sprites on each tile, anything not listed is bare floor
+        tiles = {}
+        adventurer = game.adventurer
+        tiles[(adventurer.x, adventurer.y)] = ("adventurer",)
+        for i, monster in enumerate(game.monsters):
+            tiles[(monster.x, monster.y)] = ("monster", i, monster.health)
+
+        layer = get_static_layer(game.dungeon, self.font)
+        layout_key = game.dungeon.layout_key
+        if layout_key != self.layout_key:
+            self.layout_key = layout_key
+            self.tiles = {}
+            self.screen.blit(layer, (GRID_OFFSET_X, GRID_OFFSET_Y))
+            changed = set(tiles)
+            dirty = [pygame.Rect(GRID_OFFSET_X, GRID_OFFSET_Y, GRID_SIZE * TILE_SIZE, GRID_SIZE * TILE_SIZE)]
+            whole_grid = True
+        else:
+            changed = {pos for pos in set(tiles) | set(self.tiles) if tiles.get(pos) != self.tiles.get(pos)}
+            dirty = []
+            whole_grid = False
+
+        for x, y in changed:
+            rect = tile_rect(x, y)
+            self.screen.blit(layer, rect, (x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE))
+            sprite = tiles.get((x, y))
+            if sprite is not None:
+                self.draw_entity(rect, sprite)
+            if not whole_grid:
+                dirty.append(rect)
+        self.tiles = tiles
+        return dirty
+
+    def draw_entity(self, rect, sprite):
+        if sprite[0] == "adventurer":
+            pygame.draw.circle(self.screen, GREEN, rect.center, TILE_SIZE//3)
+        else:
+            pygame.draw.circle(self.screen, RED, rect.center, TILE_SIZE//3)
+
+            # Draw health
+            health_text = render_text(self.small_font, f"{sprite[2]}", True, WHITE)
+            self.screen.blit(health_text, (rect.x + TILE_SIZE//2 - 5, rect.y + TILE_SIZE//2 - 8))
+
+            # Draw monster number
+            number_text = render_text(self.small_font, f"{sprite[1]+1}", True, BLACK)
+            self.screen.blit(number_text, (rect.x + 5, rect.y + 5))
+
+    def header_key(self, game, selected_dice):
+        return (game.level, game.adventurer.health, game.adventurer.max_health)
+
+    def draw_header(self, game, selected_dice):
+        title_text = render_text(self.title_font, f"One Card Dungeon - Level {game.level}", True, BLACK)
+        self.screen.blit(title_text, (20, 20))
+
+        # Draw health
+        health_text = render_text(self.font, f"Health: {game.adventurer.health}/{game.adventurer.max_health}", True, RED)
+        self.screen.blit(health_text, (20, 60))
+
+    def stats_key(self, game, selected_dice):
+        adv = game.adventurer
+        return (adv.speed, adv.attack, adv.defense, adv.range, game.total_speed, game.total_attack,
+                game.total_defense, game.remaining_speed, game.remaining_attack, tuple(game.dice_assigned))
+
+    def draw_stats(self, game, selected_dice):
+        font = self.font
+        screen = self.screen
+
+        # Calculate bonuses from dice
+        speed_bonus = game.total_speed - game.adventurer.speed if game.total_speed > 0 else 0
+        attack_bonus = game.total_attack - game.adventurer.attack if game.total_attack > 0 else 0
+        defense_bonus = game.total_defense - game.adventurer.defense if game.total_defense > 0 else 0
+
+        # PLAYER STATS - on the left side vertically
+        stat_x = 20
+        stat_y_start = 90  # Start below health
+        stat_spacing = 25  # Space between stat lines
+
+        # If dice haven't been assigned yet, show base values
+        if not all(game.dice_assigned) and sum(game.dice_assigned) == 0:
+            speed_text = render_text(font, f"Speed: {game.adventurer.speed}", True, BLUE)
+            attack_text = render_text(font, f"Attack: {game.adventurer.attack}", True, PURPLE)
+            defense_text = render_text(font, f"Defense: {game.adventurer.defense}", True, DARK_GREEN)
+        else:
+            # Display stats with bonuses clearly indicated on separate lines
+            speed_text = render_text(font, f"Speed: {game.adventurer.speed} + {speed_bonus} = {game.total_speed} ({game.remaining_speed})", True, BLUE)
+            attack_text = render_text(font, f"Attack: {game.adventurer.attack} + {attack_bonus} = {game.total_attack} ({game.remaining_attack})", True, PURPLE)
+            defense_text = render_text(font, f"Defense: {game.adventurer.defense} + {defense_bonus} = {game.total_defense}", True, DARK_GREEN)
+        range_text = render_text(font, f"Range: {game.adventurer.range}", True, YELLOW)
+
+        screen.blit(speed_text, (stat_x, stat_y_start))
+        screen.blit(attack_text, (stat_x, stat_y_start + stat_spacing))
+        screen.blit(defense_text, (stat_x, stat_y_start + 2 * stat_spacing))
+        screen.blit(range_text, (stat_x, stat_y_start + 3 * stat_spacing))
+
+    def monsters_key(self, game, selected_dice):
+        return (tuple(game.dungeon.monster_data), tuple((m.health, m.max_health) for m in game.monsters))
+
+    def draw_monsters(self, game, selected_dice):
+        if not game.monsters:
+            return
+        font = self.font
+        screen = self.screen
+
+        # MONSTER STATS - on the right side of the grid
+        monster_stats_x = GRID_RIGHT + 20
+        monster_stats_y = GRID_OFFSET_Y
+        monster_stats_spacing = 25
+
+        # Draw a title for monster section
+        monster_title = render_text(font, "Monsters", True, RED)
+        screen.blit(monster_title, (monster_stats_x, monster_stats_y - 30))
+
+        # Draw monster type information
+        monster_type = render_text(font, f"Type: {game.dungeon.monster_data[6]}", True, BLACK)
+        screen.blit(monster_type, (monster_stats_x, monster_stats_y))
+
+        # Draw shared monster stats (same for all monsters of this level)
+        monster_speed = render_text(font, f"Speed: {game.dungeon.monster_data[2]}", True, BLUE)
+        screen.blit(monster_speed, (monster_stats_x, monster_stats_y + monster_stats_spacing))
+
+        monster_attack = render_text(font, f"Attack: {game.dungeon.monster_data[3]}", True, PURPLE)
+        screen.blit(monster_attack, (monster_stats_x, monster_stats_y + 2 * monster_stats_spacing))
+
+        monster_defense = render_text(font, f"Defense: {game.dungeon.monster_data[4]}", True, DARK_GREEN)
+        screen.blit(monster_defense, (monster_stats_x, monster_stats_y + 3 * monster_stats_spacing))
+
+        monster_range = render_text(font, f"Range: {game.dungeon.monster_data[5]}", True, YELLOW)
+        screen.blit(monster_range, (monster_stats_x, monster_stats_y + 4 * monster_stats_spacing))
+
+        # Draw individual monster health
+        monster_list_y = monster_stats_y + 6 * monster_stats_spacing
+        monster_list_title = render_text(font, "Monster Health:", True, BLACK)
+        screen.blit(monster_list_title, (monster_stats_x, monster_list_y))
+
+        for i, monster in enumerate(game.monsters):
+            monster_health = render_text(font, f"Monster {i+1}: {monster.health}/{monster.max_health} HP", True, RED)
+            screen.blit(monster_health, (monster_stats_x, monster_list_y + (i+1) * monster_stats_spacing))
+
+    def dice_key(self, game, selected_dice):
+        if game.game_state == "energy" or not all(game.dice_assigned):
+            return (tuple(game.energy_dice), tuple(game.dice_assigned), selected_dice)
+        return None
+
+    def draw_dice(self, game, selected_dice):
+        if not (game.game_state == "energy" or not all(game.dice_assigned)):
+            return
+        total_width = 3 * DICE_WIDTH + 2 * DICE_SPACING
+        dice_start_x = (SCREEN_WIDTH - total_width) // 2
+
+        for i, value in enumerate(game.energy_dice):
+            dice_x = dice_start_x + i * (DICE_WIDTH + DICE_SPACING)
+
+            # Highlight selected dice with a yellow background
+            if selected_dice == i and not game.dice_assigned[i]:
+                color = YELLOW
+            elif game.dice_assigned[i]:
+                color = GRAY
+            else:
+                color = WHITE
+
+            pygame.draw.rect(self.screen, color, (dice_x, DICE_Y, DICE_WIDTH, DICE_WIDTH))
+            pygame.draw.rect(self.screen, BLACK, (dice_x, DICE_Y, DICE_WIDTH, DICE_WIDTH), 1)
+
+            value_text = render_text(self.font, str(value), True, BLACK)
+            self.screen.blit(value_text, (dice_x + DICE_WIDTH//2 - 7, DICE_Y + DICE_WIDTH//2 - 10))
+
+    def buttons_key(self, game, selected_dice):
+        return (game.game_state, all(game.dice_assigned), min(3, len(game.monsters)))
+
+    def draw_buttons(self, game, selected_dice):
+        font = self.font
+        screen = self.screen
+        button_y = BUTTON_Y
+
+        if game.game_state == "energy":
+            # Roll dice button
+            pygame.draw.rect(screen, BLUE, (20, button_y, 120, BUTTON_HEIGHT))
+            roll_text = render_text(font, "Roll Dice", True, WHITE)
+            screen.blit(roll_text, (40, button_y + 10))
+
+            # Assign dice buttons (if dice rolled)
+            if not all(game.dice_assigned):
+                skills = ["Speed", "Attack", "Defense"]
+                for i, skill in enumerate(skills):
+                    pygame.draw.rect(screen, GREEN, (200 + i*150, button_y, 120, BUTTON_HEIGHT))
+                    skill_text = render_text(font, f"To {skill}", True, WHITE)
+                    screen.blit(skill_text, (220 + i*150, button_y + 10))
+
+        elif game.game_state == "adventurer":
+            # End turn button
+            pygame.draw.rect(screen, RED, (SCREEN_WIDTH - 140, button_y, 120, BUTTON_HEIGHT))
+            end_text = render_text(font, "End Turn", True, WHITE)
+            screen.blit(end_text, (SCREEN_WIDTH - 120, button_y + 10))
+
+            # Attack buttons (one for each monster)
+            if game.monsters:
+                for i in range(min(3, len(game.monsters))):
+                    pygame.draw.rect(screen, PURPLE, (20 + i*150, button_y, 120, BUTTON_HEIGHT))
+                    attack_text = render_text(font, f"Attack {i+1}", True, WHITE)
+                    screen.blit(attack_text, (30 + i*150, button_y + 10))
+
+        elif game.game_state == "level_complete":
+            options = ["Speed", "Attack", "Defense", "Range", "Heal"]
+            for i, option in enumerate(options):
+                pygame.draw.rect(screen, GREEN, (20 + i*150, button_y, 120, BUTTON_HEIGHT))
+                option_text = render_text(font, option, True, WHITE)
+                screen.blit(option_text, (50 + i*150, button_y + 10))
+
+        elif game.game_state == "game_over" or game.game_state == "victory":
+            pygame.draw.rect(screen, GREEN, (SCREEN_WIDTH//2 - 60, button_y, 120, BUTTON_HEIGHT))
+            restart_text = render_text(font, "New Game", True, WHITE)
+            screen.blit(restart_text, (SCREEN_WIDTH//2 - 40, button_y + 10))
+
+    def message_key(self, game, selected_dice):
+        return (game.message, game.last_message)
+
+    def draw_message(self, game, selected_dice):
+        message_text = render_text(self.font, game.message, True, BLACK)
+        self.screen.blit(message_text, (20, SCREEN_HEIGHT - INFO_HEIGHT + 10))
+
+        # Draw last message
+        if game.last_message:
+            last_message_text = render_text(self.small_font, game.last_message, True, GRAY)
+            self.screen.blit(last_message_text, (20, SCREEN_HEIGHT - INFO_HEIGHT + 40))
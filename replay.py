@@ -0,0 +1,101 @@
+"""Recorded games.
+
+Every dungeon_core.Game owns a random stream built from its seed and logs
+the actions played on it in game.actions, as small tuples:
+
+    ("roll", d1, d2, d3)         dice rolled (also after a reroll ability)
+    ("assign", dice_index, skill)
+    ("move", dx, dy)
+    ("attack", monster_index)
+    ("end",)                     end of the adventurer's turn
+    ("advance", choice)          upgrade or heal at the end of a level
+    ("class", class_name)
+    ("ability", energy_dice)
+
+The seed and the log are enough to play the game again without a screen,
+as fast as the rules run. Rolls are not inputs: replaying draws them again
+from the seed and checks they come out the same, so a change in the rules
+or in the random calls shows up as a ValueError at the first difference.
+
+    python replay.py game.json
+"""
+import argparse
+import json
+import sys
+
+from dungeon_core import GRID_SIZE, Game, set_error_mode
+from layouts import LayoutPool
+
+def record(game):
+    data = {"seed": game.seed, "actions": [list(action) for action in game.actions]}
+    # Only games off the standard board carry their size
+    if (game.width, game.height) != (GRID_SIZE, GRID_SIZE):
+        data["width"], data["height"] = game.width, game.height
+    # Generated layouts come back from the pool's seed
+    if game.layouts is not None:
+        data["layouts"] = game.layouts.describe()
+    return data
+
+def save_replay(game, path):
+    with open(path, "w") as f:
+        json.dump(record(game), f)
+
+def load_replay(path):
+    with open(path) as f:
+        return json.load(f)
+
+def apply_action(game, action):
+    kind = action[0]
+    if kind == "roll":
+        game.roll_energy_dice()
+    elif kind == "assign":
+        game.assign_dice(action[1], action[2])
+    elif kind == "move":
+        game.move_adventurer(action[1], action[2])
+    elif kind == "attack":
+        game.attack_monster(action[1])
+    elif kind == "end":
+        game.end_adventurer_turn()
+    elif kind == "advance":
+        game.advance_level(action[1])
+    elif kind == "class":
+        game.choose_class(action[1])
+    elif kind == "ability":
+        game.use_class_ability(action[1])
+    else:
+        raise ValueError(f"unknown action {action!r}")
+
+def replay(data, game_class=Game):
+    # Play a record() again and return the game at the end of it
+    layouts = LayoutPool(**data["layouts"]) if "layouts" in data else None
+    game = game_class(seed=data["seed"], width=data.get("width", GRID_SIZE),
+                      height=data.get("height", GRID_SIZE), layouts=layouts)
+    for i, action in enumerate(data["actions"]):
+        action = tuple(action)
+        # Rerolls from an ability are logged by the ability itself
+        if i >= len(game.actions):
+            apply_action(game, action)
+        if i >= len(game.actions) or game.actions[i] != action:
+            played = game.actions[i] if i < len(game.actions) else None
+            raise ValueError(f"replay diverged at action {i}: expected {action!r}, got {played!r}")
+    return game
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play a recorded game again")
+    parser.add_argument("path", help="JSON file written by save_replay")
+    args = parser.parse_args(argv)
+
+    # A replay is for finding bugs: let them raise
+    set_error_mode("strict")
+    data = load_replay(args.path)
+    try:
+        game = replay(data)
+    except ValueError as e:
+        print(e)
+        return 1
+    print(f"seed {game.seed}: {len(game.actions)} actions, {game.game_state} "
+          f"on level {game.level} with {game.adventurer.health} health")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
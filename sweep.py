@@ -0,0 +1,295 @@
+"""Parameter sweeps over the monster stats, with every turn kept on disk.
+
+A sweep point is the get_monster_data table with some stats shifted (every
+monster +1 attack, say) and is played by batch_sim.BatchSimulator. Every
+turn of every game becomes one record, written straight into memory-mapped
+.npy columns by the worker process that plays the point, in parts of
+--part-rows records:
+
+    results/manifest.json
+    results/point-0000/part-0000/game.npy, turn.npy, level.npy, ...
+
+Workers only send back the list of parts they wrote, so the records never
+go through pickle. The manifest lists the points, the stats each one played
+with and how many records each part holds.
+
+ResultsReader goes through the parts one memory-mapped chunk at a time, so
+the aggregates (win rate, deaths and damage per level for each point) need
+the same memory for a thousand records or a billion:
+
+    python sweep.py run results --games 10000 --vary attack=-1,0,1 --vary range=0,1 --workers 4
+    python sweep.py report results
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from batch_sim import GAME_OVER, MAX_LEVEL, MAX_MONSTERS, RUNNING, TIMEOUT, VICTORY, BatchSimulator, get_tables
+
+# Columns of get_monster_data, as in batch_sim's monster_stats
+STATS = ("count", "health", "speed", "attack", "defense", "range")
+
+# One record per game and turn: name, dtype
+RECORD_COLUMNS = (
+    ("game", np.int32),
+    ("turn", np.int32),      # turns played so far, this one included
+    ("level", np.int16),     # level the turn was played on
+    ("health", np.int16),    # adventurer health at the end of the turn
+    ("damage", np.int16),    # health lost to the monsters this turn
+    ("monsters", np.int8),   # monsters alive at the end of the turn
+    ("state", np.int8),      # batch_sim state code at the end of the turn
+)
+
+PART_ROWS = 1 << 22
+CHUNK_ROWS = 1 << 20
+
+def parse_vary(text):
+    # "attack=-1,0,1" -> ("attack", [-1, 0, 1])
+    stat, _, values = text.partition("=")
+    if stat not in STATS or not values:
+        raise argparse.ArgumentTypeError(f"expected STAT=D1,D2,... with STAT one of {', '.join(STATS)}")
+    return stat, [int(value) for value in values.split(",")]
+
+def sweep_points(vary):
+    # Every combination of the deltas, as {stat: delta}
+    stats = [stat for stat, deltas in vary]
+    return [dict(zip(stats, combination)) for combination in itertools.product(*(deltas for stat, deltas in vary))]
+
+def monster_stats_for(deltas, levels=None):
+    # get_monster_data table with the deltas added on the given levels,
+    # kept within what the simulator plays (1-3 monsters, defense >= 1)
+    stats = get_tables().monster_stats.copy()
+    rows = list(levels) if levels else list(range(1, MAX_LEVEL + 1))
+    for stat, delta in deltas.items():
+        stats[rows, STATS.index(stat)] += delta
+    stats[1:, 0] = np.clip(stats[1:, 0], 1, MAX_MONSTERS)
+    stats[1:, 1] = np.maximum(stats[1:, 1], 1)
+    stats[1:, 4] = np.maximum(stats[1:, 4], 1)
+    stats[1:] = np.maximum(stats[1:], 0)
+    return stats
+
+class RecordWriter:
+    """Appends records to memory-mapped column files, one part at a time."""
+    def __init__(self, directory, part_rows=PART_ROWS):
+        self.directory = directory
+        self.part_rows = part_rows
+        self.parts = []
+        self.columns = None
+        self.rows = 0
+        os.makedirs(directory)
+
+    def new_part(self):
+        name = f"part-{len(self.parts):04d}"
+        path = os.path.join(self.directory, name)
+        os.makedirs(path)
+        self.columns = {
+            column: np.lib.format.open_memmap(os.path.join(path, column + ".npy"), mode="w+",
+                                              dtype=dtype, shape=(self.part_rows,))
+            for column, dtype in RECORD_COLUMNS
+        }
+        self.parts.append({"path": os.path.join(os.path.basename(self.directory), name), "rows": 0})
+        self.rows = 0
+
+    def append(self, values):
+        # values: column -> array, all of the same length
+        count = len(values["game"])
+        start = 0
+        while start < count:
+            if self.columns is None or self.rows == self.part_rows:
+                self.close_part()
+                self.new_part()
+            take = min(count - start, self.part_rows - self.rows)
+            for column, data in self.columns.items():
+                data[self.rows:self.rows + take] = values[column][start:start + take]
+            self.rows += take
+            self.parts[-1]["rows"] = self.rows
+            start += take
+
+    def close_part(self):
+        if self.columns is not None:
+            for data in self.columns.values():
+                data.flush()
+            self.columns = None
+
+    def close(self):
+        self.close_part()
+        return self.parts
+
+def run_point(directory, index, deltas, monster_stats, games, seed, max_turns, part_rows):
+    # Worker entry point: play one sweep point and write its records
+    start = time.perf_counter()
+    sim = BatchSimulator(games, None if seed is None else (seed, index), max_turns, monster_stats)
+    writer = RecordWriter(os.path.join(directory, f"point-{index:04d}"), part_rows)
+    while (sim.state == RUNNING).any():
+        rows = np.flatnonzero(sim.state == RUNNING)
+        level = sim.level[rows]
+        health = sim.health[rows]
+        sim.step()
+        after = sim.health[rows]
+        writer.append({
+            "game": rows,
+            "turn": sim.turns[rows],
+            "level": level,
+            "health": after,
+            "damage": np.maximum(health - after, 0),
+            "monsters": sim.alive[rows].sum(axis=1),
+            "state": sim.state[rows],
+        })
+    return {
+        "index": index,
+        "deltas": deltas,
+        "monster_stats": np.asarray(monster_stats)[1:].tolist(),
+        "parts": writer.close(),
+        "seconds": time.perf_counter() - start,
+    }
+
+def run_sweep(directory, vary, games, seed=0, max_turns=1000, workers=1, levels=None, part_rows=PART_ROWS):
+    manifest_path = os.path.join(directory, "manifest.json")
+    if os.path.exists(manifest_path):
+        raise ValueError(f"{directory} already holds a sweep")
+    os.makedirs(directory, exist_ok=True)
+
+    points = sweep_points(vary)
+    jobs = [(directory, index, deltas, monster_stats_for(deltas, levels), games, seed, max_turns, part_rows)
+            for index, deltas in enumerate(points)]
+    if workers <= 1:
+        done = [run_point(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(run_point, *job) for job in jobs]
+            done = [future.result() for future in as_completed(futures)]
+
+    manifest = {
+        "games": games,
+        "seed": seed,
+        "max_turns": max_turns,
+        "levels": list(levels) if levels else None,
+        "stats": list(STATS),
+        "columns": [[column, np.dtype(dtype).str] for column, dtype in RECORD_COLUMNS],
+        "points": sorted(done, key=lambda point: point["index"]),
+    }
+    # Written last and renamed, so a manifest always describes finished parts
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+class ResultsReader:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.points = self.manifest["points"]
+
+    def records(self):
+        return sum(part["rows"] for point in self.points for part in point["parts"])
+
+    def chunks(self, columns=None, point=None, chunk_rows=CHUNK_ROWS):
+        # (point index, {column: array}) for up to chunk_rows records at a
+        # time. The arrays are views of the memory-mapped files: only the
+        # pages a chunk touches are read.
+        columns = columns or [column for column, dtype in RECORD_COLUMNS]
+        for entry in self.points:
+            if point is not None and entry["index"] != point:
+                continue
+            for part in entry["parts"]:
+                path = os.path.join(self.directory, part["path"])
+                data = {column: np.load(os.path.join(path, column + ".npy"), mmap_mode="r") for column in columns}
+                for start in range(0, part["rows"], chunk_rows):
+                    stop = min(start + chunk_rows, part["rows"])
+                    yield entry["index"], {column: array[start:stop] for column, array in data.items()}
+
+    def aggregate(self, chunk_rows=CHUNK_ROWS):
+        # Totals per point, added up chunk by chunk
+        levels = MAX_LEVEL + 1
+        totals = {}
+        for index, chunk in self.chunks(("level", "damage", "state"), chunk_rows=chunk_rows):
+            point = totals.get(index)
+            if point is None:
+                point = totals[index] = {
+                    "turns": np.zeros(levels, dtype=np.int64),
+                    "damage": np.zeros(levels, dtype=np.int64),
+                    "deaths": np.zeros(levels, dtype=np.int64),
+                    "wins": 0,
+                    "timeouts": 0,
+                }
+            level = chunk["level"]
+            state = chunk["state"]
+            point["turns"] += np.bincount(level, minlength=levels)
+            point["damage"] += np.bincount(level, weights=chunk["damage"], minlength=levels).astype(np.int64)
+            point["deaths"] += np.bincount(level[state == GAME_OVER], minlength=levels)
+            point["wins"] += int(np.count_nonzero(state == VICTORY))
+            point["timeouts"] += int(np.count_nonzero(state == TIMEOUT))
+
+        games = self.manifest["games"]
+        results = []
+        for entry in self.points:
+            point = totals.get(entry["index"])
+            if point is None:
+                continue
+            turns = point["turns"][1:]
+            results.append({
+                "index": entry["index"],
+                "deltas": entry["deltas"],
+                "games": games,
+                "win_rate": point["wins"] / games,
+                "timeouts": point["timeouts"],
+                "mean_turns": int(turns.sum()) / games,
+                "damage_per_turn": int(point["damage"].sum()) / max(int(turns.sum()), 1),
+                "deaths_by_level": point["deaths"][1:].tolist(),
+                "damage_per_turn_by_level": (point["damage"][1:] / np.maximum(turns, 1)).tolist(),
+            })
+        return results
+
+def describe_deltas(deltas):
+    return " ".join(f"{stat}{delta:+d}" for stat, delta in deltas.items()) or "base"
+
+def report(results):
+    lines = ["point  deltas                          wins   turns  damage/turn  deaths by level"]
+    for result in results:
+        lines.append(f"{result['index']:5d}  {describe_deltas(result['deltas']):<30} {result['win_rate']:6.2%} "
+                     f"{result['mean_turns']:7.1f}  {result['damage_per_turn']:11.3f}  "
+                     f"{' '.join(str(d) for d in result['deaths_by_level'])}")
+    return "\n".join(lines)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sweep the monster stats with batch_sim and keep every turn.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="play the sweep and write the records")
+    run.add_argument("directory")
+    run.add_argument("--vary", type=parse_vary, action="append", default=[], metavar="STAT=D1,D2",
+                     help=f"deltas for one stat ({', '.join(STATS)}), repeat for a grid")
+    run.add_argument("--levels", type=int, nargs="+", help="levels the deltas apply to (default all)")
+    run.add_argument("--games", type=int, default=10000, help="games per point")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--max-turns", type=int, default=1000)
+    run.add_argument("--workers", type=int, default=1)
+    run.add_argument("--part-rows", type=int, default=PART_ROWS, help="records per column file")
+
+    show = commands.add_parser("report", help="aggregate the records of a sweep")
+    show.add_argument("directory")
+    show.add_argument("--json", help="also write the aggregates to this JSON file")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        start = time.perf_counter()
+        run_sweep(args.directory, args.vary, args.games, args.seed, args.max_turns,
+                  args.workers, args.levels, args.part_rows)
+
+    reader = ResultsReader(args.directory)
+    if args.command == "run":
+        print(f"{len(reader.points)} points, {reader.records()} records in {time.perf_counter() - start:.1f}s")
+    results = reader.aggregate()
+    print(report(results))
+    if getattr(args, "json", None):
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
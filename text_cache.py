@@ -0,0 +1,67 @@
+"""Cache for rendered text surfaces.
+
+Almost every string on screen ("Roll Dice", "Monsters", "Speed: 5") is the
+same from one frame to the next, so the surfaces coming out of
+font.render are kept in a small LRU cache keyed by (font, text, color,
+antialias). The returned surfaces are shared: blit them, never draw on them.
+
+Fonts made with pygame.font.Font(name, size) are cached too, otherwise a
+new Font object each frame would never hit the text cache.
+"""
+from collections import OrderedDict
+
+import pygame
+
+class TextCache:
+    def __init__(self, max_size=512):
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, antialias, color):
+        key = (font, text, tuple(color), antialias)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+
+        self.misses += 1
+        surface = font.render(text, antialias, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_size:
+            # Drop the least recently used text
+            self.surfaces.popitem(last=False)
+        return surface
+
+    def clear(self):
+        self.surfaces.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.surfaces),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+text_cache = TextCache()
+
+def render_text(font, text, antialias, color):
+    # Drop-in replacement for font.render(text, antialias, color)
+    return text_cache.render(font, text, antialias, color)
+
+_fonts = {}
+
+def get_font(name, size):
+    # Same as pygame.font.Font(name, size), one object per (name, size)
+    font = _fonts.get((name, size))
+    if font is None:
+        font = pygame.font.Font(name, size)
+        _fonts[(name, size)] = font
+    return font